@@ -0,0 +1,237 @@
+# Copyright 2016 International Business Machines
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+#
+# Burn-in benchmarks that catch under-performing nodes before deployment.
+#
+# Memory bandwidth is measured with large buffer copies, which glibc turns
+# into vector (VSX) loads and stores, once per NUMA node under
+# numactl --cpunodebind --membind so every node's DIMMs are tested on
+# their own.  Disks are read sequentially and at random offsets with
+# O_DIRECT, all devices at the same time.
+#
+# The memory test runs in a child process:
+#
+#   python -m powerpc_hardware_manager.burnin memory <size_mb> <iterations>
+#
+# which prints {"mb_per_second": ...}.
+#
+
+import json
+import mmap
+import os
+import random
+import sys
+import threading
+import time
+
+from oslo_concurrency import processutils
+from oslo_log import log
+
+from ironic_python_agent import utils
+
+LOG = log.getLogger()
+
+MEMORY_SIZE_MB = 256
+MEMORY_ITERATIONS = 8
+SEQUENTIAL_READ_MB = 1024
+RANDOM_READS = 2000
+RANDOM_READ_SIZE = 4096
+SEQUENTIAL_BLOCK_SIZE = 2 ** 20
+DEFAULT_TOLERANCE = 0.10
+
+
+def memory_bandwidth(size_mb=MEMORY_SIZE_MB, iterations=MEMORY_ITERATIONS):
+    """Return the copy bandwidth in MB/s, counting both read and write."""
+    size = size_mb * 2 ** 20
+    src = bytearray(size)
+    dst = bytearray(size)
+    # Fault every page in before timing
+    dst[:] = src
+
+    start = time.time()
+    for _ in range(iterations):
+        dst[:] = src
+    seconds = time.time() - start
+
+    return round(2 * size_mb * iterations / seconds, 1)
+
+
+def run_memory_tests(nodes, size_mb=MEMORY_SIZE_MB,
+                     iterations=MEMORY_ITERATIONS):
+    """Measure memory bandwidth on every NUMA node, one node at a time.
+
+    :param nodes: NUMA node ids with memory, may be empty
+    :return: {node id: MB/s}, or {'all': MB/s} when the test could not be
+        pinned
+    """
+    cmd = (sys.executable, '-m', 'powerpc_hardware_manager.burnin',
+           'memory', str(size_mb), str(iterations))
+
+    results = {}
+    for node in nodes:
+        try:
+            out, _ = utils.execute('numactl',
+                                   '--cpunodebind=%d' % node,
+                                   '--membind=%d' % node,
+                                   *cmd)
+        except (processutils.ProcessExecutionError, OSError) as e:
+            LOG.warning("Pinned memory test on node %(node)s failed, "
+                        "measuring unpinned: %(err)s",
+                        {'node': node, 'err': e})
+            return {'all': memory_bandwidth(size_mb, iterations)}
+        results[node] = json.loads(out)['mb_per_second']
+
+    if not results:
+        results['all'] = memory_bandwidth(size_mb, iterations)
+    return results
+
+
+def _open_direct(name):
+    return os.fdopen(os.open(name, os.O_RDONLY | getattr(os, 'O_DIRECT', 0)),
+                     'rb', 0)
+
+
+def read_test(block_device, sequential_mb=SEQUENTIAL_READ_MB,
+              random_reads=RANDOM_READS):
+    """Read one device sequentially and at random offsets.
+
+    :param block_device: a BlockDevice
+    :return: a dictionary with seq_read_mb_s and random_read_iops
+    """
+    # O_DIRECT needs aligned buffers, anonymous mmaps are page aligned
+    buf = mmap.mmap(-1, SEQUENTIAL_BLOCK_SIZE)
+    small = mmap.mmap(-1, RANDOM_READ_SIZE)
+    sequential_mb = min(sequential_mb, block_device.size // 2 ** 20)
+    result = {'name': block_device.name,
+              'model': (block_device.model or '').strip()}
+
+    with _open_direct(block_device.name) as f:
+        start = time.time()
+        done = 0
+        for _ in range(sequential_mb):
+            read = f.readinto(buf)
+            if not read:
+                break
+            done += read
+        seconds = time.time() - start
+        result['seq_read_mb_s'] = round(float(done) / 2 ** 20 / seconds, 1)
+
+        blocks = block_device.size // RANDOM_READ_SIZE
+        start = time.time()
+        for _ in range(random_reads):
+            f.seek(random.randrange(blocks) * RANDOM_READ_SIZE)
+            f.readinto(small)
+        seconds = time.time() - start
+        result['random_read_iops'] = int(random_reads / seconds)
+
+    buf.close()
+    small.close()
+    return result
+
+
+def run_disk_tests(block_devices, sequential_mb=SEQUENTIAL_READ_MB,
+                   random_reads=RANDOM_READS):
+    """Run read_test on all devices at once.
+
+    :return: {device name: result}, with an 'error' for devices that failed
+    """
+    results = {}
+    lock = threading.Lock()
+
+    def worker(block_device):
+        try:
+            result = read_test(block_device, sequential_mb, random_reads)
+        except Exception as e:
+            # Anything, such as randrange(0) on a device smaller than one
+            # random read, must end up in the results or evaluate would
+            # pass a node with a broken disk
+            LOG.warning("Read test of %(dev)s failed: %(err)s",
+                        {'dev': block_device.name, 'err': e})
+            result = {'name': block_device.name,
+                      'error': str(e) or type(e).__name__}
+        with lock:
+            results[block_device.name] = result
+
+    threads = [threading.Thread(target=worker, args=(block_device, ))
+               for block_device in block_devices]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return results
+
+
+def _median(values):
+    values = sorted(values)
+    middle = len(values) // 2
+    if len(values) % 2:
+        return values[middle]
+    return (values[middle - 1] + values[middle]) / 2.0
+
+
+def evaluate(memory, disks, product_name, thresholds, tolerance):
+    """Compare results against thresholds.
+
+    Memory is checked against thresholds['memory'][product_name], disks
+    against thresholds['disks'][model].  Disks without a threshold for
+    their model are compared with the median of the same model in this
+    node, which catches a single slow disk in a uniform shelf.
+
+    :return: a list of human readable failures, empty when all passed
+    """
+    failures = []
+    floor = 1.0 - tolerance
+
+    memory_threshold = thresholds.get('memory', {}).get(product_name)
+    if memory_threshold is None:
+        memory_threshold = thresholds.get('memory', {}).get('default')
+    for (node, mb_per_second) in sorted(memory.items()):
+        if memory_threshold and mb_per_second < memory_threshold * floor:
+            failures.append("memory on node %s: %s MB/s, expected %s"
+                            % (node, mb_per_second, memory_threshold))
+
+    by_model = {}
+    for result in disks.values():
+        if 'error' in result:
+            failures.append("%s: %s" % (result['name'], result['error']))
+            continue
+        by_model.setdefault(result['model'], []).append(result)
+
+    for (model, results) in sorted(by_model.items()):
+        model_thresholds = thresholds.get('disks', {}).get(model)
+        for key in ('seq_read_mb_s', 'random_read_iops'):
+            if model_thresholds and key in model_thresholds:
+                expected = model_thresholds[key]
+            elif len(results) > 2:
+                expected = _median([result[key] for result in results])
+            else:
+                continue
+            for result in results:
+                if result[key] < expected * floor:
+                    failures.append("%s (%s): %s %s, expected %s"
+                                    % (result['name'], model, key,
+                                       result[key], expected))
+
+    return failures
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 4 and sys.argv[1] == 'memory':
+        print(json.dumps({'mb_per_second':
+                          memory_bandwidth(int(sys.argv[2]),
+                                           int(sys.argv[3]))}))
+    else:
+        sys.exit("usage: %s memory <size_mb> <iterations>" % sys.argv[0])
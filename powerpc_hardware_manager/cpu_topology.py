@@ -0,0 +1,224 @@
+# Copyright 2016 International Business Machines
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+#
+# POWER CPU topology: chip -> core -> hardware thread, NUMA placement and
+# the current SMT mode, collected in one sweep over sysfs.
+#
+# lscpu's "CPU(s)" counts every SMT thread, and on POWER the number of
+# online threads changes with ppc64_cpu --smt, so neither tells how many
+# cores a machine has.  Here every present logical CPU is mapped to its
+# core and chip through
+#
+#   /sys/devices/system/cpu/{present,online}
+#   /sys/devices/system/cpu/cpu<N>/topology/{core_id,physical_package_id}
+#   /sys/devices/system/cpu/cpu<N>/of_node -> /proc/device-tree/cpus/...
+#       ibm,chip-id, ibm,ppc-interrupt-server#s, reg
+#   /sys/devices/system/node/node<N>/cpulist
+#
+# Sets of CPUs are kept as integer bitmaps and per CPU data in arrays
+# indexed by the logical CPU number.
+#
+
+import array
+import os
+
+from oslo_log import log
+
+from ironic_python_agent import encoding
+
+from powerpc_hardware_manager import sysfs
+
+LOG = log.getLogger()
+
+
+def parse_cpu_list(value):
+    """Turn a kernel CPU list such as '0-7,16,18-19' into a bitmap."""
+    bitmap = 0
+    for part in value.strip().split(','):
+        if not part:
+            continue
+        if '-' in part:
+            (first, last) = part.split('-', 1)
+            for cpu in range(int(first), int(last) + 1):
+                bitmap |= 1 << cpu
+        else:
+            bitmap |= 1 << int(part)
+    return bitmap
+
+
+def format_cpu_list(bitmap):
+    """Turn a bitmap back into the kernel's CPU list format."""
+    ranges = []
+    cpu = 0
+    while bitmap >> cpu:
+        if not (bitmap >> cpu) & 1:
+            cpu += 1
+            continue
+        first = cpu
+        while (bitmap >> (cpu + 1)) & 1:
+            cpu += 1
+        ranges.append(str(first) if first == cpu else '%d-%d' % (first, cpu))
+        cpu += 1
+    return ','.join(ranges)
+
+
+def bitmap_cpus(bitmap):
+    cpu = 0
+    while bitmap >> cpu:
+        if (bitmap >> cpu) & 1:
+            yield cpu
+        cpu += 1
+
+
+class CpuTopology(encoding.SerializableComparable):
+    serializable_fields = ('present', 'online', 'chips', 'cores',
+                           'threads_per_core', 'smt_mode', 'numa_nodes',
+                           'thread_core', 'thread_chip', 'thread_node')
+
+    def __init__(self, present=0, online=0):
+        self.present_map = present
+        self.online_map = online
+        size = present.bit_length() if present else 0
+        # Indexed by logical CPU number, -1 where unknown
+        self.core = array.array('l', [-1] * size)
+        self.chip = array.array('l', [-1] * size)
+        self.node = array.array('l', [-1] * size)
+        self.threads_per_core = None
+        self.node_maps = {}
+
+    @property
+    def present(self):
+        return format_cpu_list(self.present_map)
+
+    @property
+    def online(self):
+        return format_cpu_list(self.online_map)
+
+    def _core_maps(self, online_only=False):
+        cores = {}
+        cpus = self.online_map if online_only else self.present_map
+        for cpu in bitmap_cpus(cpus):
+            key = (self.chip[cpu], self.core[cpu])
+            cores[key] = cores.get(key, 0) | (1 << cpu)
+        return cores
+
+    @property
+    def chips(self):
+        """{chip id: number of cores}"""
+        chips = {}
+        for (chip, _) in self._core_maps():
+            chips[chip] = chips.get(chip, 0) + 1
+        return chips
+
+    @property
+    def cores(self):
+        return len(self._core_maps())
+
+    @property
+    def smt_mode(self):
+        """Online threads per core, the setting of ppc64_cpu --smt."""
+        counts = [bin(bitmap).count('1')
+                  for bitmap in self._core_maps(online_only=True).values()]
+        return max(counts) if counts else None
+
+    @property
+    def numa_nodes(self):
+        return dict((node, format_cpu_list(bitmap))
+                    for (node, bitmap) in self.node_maps.items())
+
+    @property
+    def thread_core(self):
+        return self.core.tolist()
+
+    @property
+    def thread_chip(self):
+        return self.chip.tolist()
+
+    @property
+    def thread_node(self):
+        return self.node.tolist()
+
+
+def collect_cpu_topology(sys_path='/sys'):
+    """Sweep sysfs once for the CPU topology.
+
+    :param sys_path: where sysfs is mounted
+    :return: a CpuTopology
+    """
+    cpu_path = os.path.join(sys_path, 'devices', 'system', 'cpu')
+    present = sysfs.read_file(os.path.join(cpu_path, 'present'))
+    online = sysfs.read_file(os.path.join(cpu_path, 'online'))
+    if present is None:
+        LOG.warning("No CPU topology under %s", cpu_path)
+        return CpuTopology()
+
+    topology = CpuTopology(parse_cpu_list(present.decode('ascii')),
+                           parse_cpu_list((online or b'').decode('ascii')))
+
+    # Device tree cpu nodes are per core, so most CPUs share one
+    of_nodes = {}
+
+    for cpu in bitmap_cpus(topology.present_map):
+        base = os.path.join(cpu_path, 'cpu%d' % cpu)
+
+        # Offline threads have no topology directory on older kernels, but
+        # they still link to their core in the device tree
+        of_node = None
+        if os.path.islink(os.path.join(base, 'of_node')):
+            of_node = os.path.realpath(os.path.join(base, 'of_node'))
+        if of_node is not None and of_node not in of_nodes:
+            def prop(name):
+                return sysfs.cells(sysfs.read_file(os.path.join(of_node,
+                                                                name)))
+
+            servers = prop('ibm,ppc-interrupt-server#s')
+            chip = prop('ibm,chip-id')
+            reg = prop('reg')
+            of_nodes[of_node] = (chip[0] if chip else None,
+                                 reg[0] if reg else None,
+                                 len(servers) or None)
+        (dt_chip, dt_core, dt_threads) = of_nodes.get(of_node,
+                                                      (None, None, None))
+
+        core = sysfs.read_int(os.path.join(base, 'topology', 'core_id'))
+        chip = sysfs.read_int(os.path.join(base, 'topology',
+                                           'physical_package_id'))
+        if core is None:
+            core = dt_core
+        if chip is None or chip < 0:
+            chip = dt_chip
+
+        topology.core[cpu] = core if core is not None else -1
+        topology.chip[cpu] = chip if chip is not None else -1
+        if dt_threads and topology.threads_per_core is None:
+            topology.threads_per_core = dt_threads
+
+    node_path = os.path.join(sys_path, 'devices', 'system', 'node')
+    try:
+        names = os.listdir(node_path)
+    except OSError:
+        names = []
+    for name in names:
+        if not (name.startswith('node') and name[4:].isdigit()):
+            continue
+        cpulist = sysfs.read_file(os.path.join(node_path, name, 'cpulist'))
+        if cpulist is None:
+            continue
+        bitmap = parse_cpu_list(cpulist.decode('ascii'))
+        topology.node_maps[int(name[4:])] = bitmap
+        for cpu in bitmap_cpus(bitmap & topology.present_map):
+            topology.node[cpu] = int(name[4:])
+
+    return topology
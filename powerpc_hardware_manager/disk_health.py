@@ -0,0 +1,263 @@
+# Copyright 2016 International Business Machines
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+#
+# SMART and NVMe health collection for the block device inventory.
+#
+# Every device is queried in its own thread and the whole collection is
+# bounded by one deadline.  Results are cached per device for
+# CACHE_SECONDS, so the lookup and the inspection inventories of one
+# cycle only hit the drives once.
+#
+
+import os
+import threading
+import time
+
+from oslo_concurrency import processutils
+from oslo_log import log
+
+from ironic_python_agent import encoding
+from ironic_python_agent import utils
+
+LOG = log.getLogger()
+
+DEFAULT_DEADLINE = 30
+CACHE_SECONDS = 600
+
+# ATA attribute name -> DiskHealth field, taken from the raw value
+ATA_ATTRIBUTES = {
+    'Reallocated_Sector_Ct': 'reallocated_sectors',
+    'Current_Pending_Sector': 'pending_sectors',
+    'Power_On_Hours': 'power_on_hours',
+    'Temperature_Celsius': 'temperature',
+    'Reported_Uncorrect': 'media_errors',
+}
+
+# nvme smart-log key -> DiskHealth field
+NVME_FIELDS = {
+    'critical_warning': 'critical_warning',
+    'temperature': 'temperature',
+    'percentage_used': 'percent_used',
+    'percent_used': 'percent_used',
+    'media_errors': 'media_errors',
+    'power_on_hours': 'power_on_hours',
+}
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+class DiskHealth(encoding.SerializableComparable):
+    serializable_fields = ('name', 'serial', 'transport', 'status',
+                           'passed', 'temperature', 'power_on_hours',
+                           'media_errors', 'reallocated_sectors',
+                           'pending_sectors', 'percent_used',
+                           'critical_warning')
+    __slots__ = serializable_fields + ('collected_at', )
+
+    def __init__(self, name, serial=None, transport=None, status='ok',
+                 passed=None, temperature=None, power_on_hours=None,
+                 media_errors=None, reallocated_sectors=None,
+                 pending_sectors=None, percent_used=None,
+                 critical_warning=None):
+        self.name = name
+        self.serial = serial
+        self.transport = transport
+        self.status = status
+        self.passed = passed
+        self.temperature = temperature
+        self.power_on_hours = power_on_hours
+        self.media_errors = media_errors
+        self.reallocated_sectors = reallocated_sectors
+        self.pending_sectors = pending_sectors
+        self.percent_used = percent_used
+        self.critical_warning = critical_warning
+        self.collected_at = time.time()
+
+
+def _to_int(value):
+    """Turn '1,234', '35 C', '3%', '0035' or '0x04' into an integer."""
+    fields = value.split()
+    if not fields:
+        return None
+    value = fields[0].replace(',', '').rstrip('%')
+    try:
+        if value.lower().startswith('0x'):
+            return int(value, 16)
+        return int(value, 10)
+    except ValueError:
+        return None
+
+
+def _parse_nvme_smart_log(out, health):
+    # critical_warning                    : 0
+    # temperature                         : 35 C
+    # percentage_used                     : 0%
+    for line in out.split('\n'):
+        key, sep, value = line.partition(':')
+        if not sep:
+            continue
+        field = NVME_FIELDS.get(key.strip().lower())
+        if field is not None and value.strip():
+            setattr(health, field, _to_int(value))
+
+    if health.temperature is not None and health.temperature > 200:
+        # Older nvme-cli reports Kelvin without a unit
+        health.temperature -= 273
+    if health.critical_warning is not None:
+        health.passed = health.critical_warning == 0
+
+
+def _parse_smartctl(out, health):
+    in_table = False
+    for line in out.split('\n'):
+        stripped = line.strip()
+
+        # ATA: SMART overall-health self-assessment test result: PASSED
+        # SCSI: SMART Health Status: OK
+        if (stripped.startswith('SMART overall-health') or
+                stripped.startswith('SMART Health Status')):
+            result = stripped.rsplit(':', 1)[-1].strip().upper()
+            health.passed = result in ('PASSED', 'OK')
+            continue
+
+        if stripped.startswith('Current Drive Temperature:'):
+            health.temperature = _to_int(stripped.split(':', 1)[1])
+            continue
+        if stripped.startswith('Elements in grown defect list:'):
+            health.reallocated_sectors = _to_int(stripped.split(':', 1)[1])
+            continue
+        if stripped.startswith('Accumulated power on time'):
+            # Accumulated power on time, hours:minutes 1234:56
+            health.power_on_hours = _to_int(
+                stripped.rsplit(' ', 1)[-1].split(':')[0])
+            continue
+
+        if stripped.startswith('ID# ATTRIBUTE_NAME'):
+            in_table = True
+            continue
+        if not in_table:
+            continue
+        if not stripped:
+            in_table = False
+            continue
+
+        #   5 Reallocated_Sector_Ct 0x0033 100 100 010 Pre-fail Always - 0
+        fields = stripped.split()
+        if len(fields) < 10:
+            continue
+        field = ATA_ATTRIBUTES.get(fields[1])
+        if field is not None:
+            setattr(health, field, _to_int(fields[9]))
+
+
+def _collect(block_device):
+    name = block_device.name
+    if os.path.basename(name).startswith('nvme'):
+        health = DiskHealth(name, serial=block_device.serial,
+                            transport='nvme')
+        cmd = ('nvme', 'smart-log', name)
+        parse = _parse_nvme_smart_log
+    else:
+        health = DiskHealth(name, serial=block_device.serial,
+                            transport='scsi')
+        cmd = ('smartctl', '-H', '-A', name)
+        parse = _parse_smartctl
+
+    try:
+        # smartctl uses its exit code as a bit mask of findings
+        out, _ = utils.execute(*cmd, check_exit_code=False)
+    except (processutils.ProcessExecutionError, OSError) as e:
+        LOG.warning("Cannot collect health of %(dev)s: %(err)s",
+                    {'dev': name, 'err': e})
+        health.status = 'error'
+        return health
+
+    # Only ATA drives report an attribute table and overall-health
+    if health.transport == 'scsi' and ('ATTRIBUTE_NAME' in out or
+                                       'overall-health' in out):
+        health.transport = 'ata'
+    parse(out, health)
+    return health
+
+
+def _cache_key(block_device):
+    return (block_device.name, block_device.serial)
+
+
+def _cached(block_device, now):
+    with _cache_lock:
+        health = _cache.get(_cache_key(block_device))
+    if health is not None and now - health.collected_at < CACHE_SECONDS:
+        return health
+    return None
+
+
+def collect_disk_health(block_devices, deadline=DEFAULT_DEADLINE):
+    """Collect the health of many block devices at once.
+
+    :param block_devices: a list of BlockDevices
+    :param deadline: seconds the whole collection may take.  Devices that
+        have not answered by then are reported with status 'timeout'; their
+        query keeps running and lands in the cache for the next inventory.
+    :return: a list of DiskHealth, in the order of block_devices
+    """
+    now = time.time()
+    results = {}
+    threads = []
+
+    def worker(block_device):
+        try:
+            health = _collect(block_device)
+        except Exception as e:
+            # Unexpected output, report an error rather than a timeout
+            LOG.warning("Cannot collect health of %(dev)s: %(err)s",
+                        {'dev': block_device.name, 'err': e})
+            health = DiskHealth(block_device.name,
+                                serial=block_device.serial,
+                                status='error')
+        with _cache_lock:
+            _cache[_cache_key(block_device)] = health
+
+    for block_device in block_devices:
+        health = _cached(block_device, now)
+        if health is not None:
+            results[block_device.name] = health
+            continue
+        thread = threading.Thread(target=worker, args=(block_device, ))
+        thread.daemon = True
+        thread.start()
+        threads.append((block_device, thread))
+
+    end = now + deadline
+    for (block_device, thread) in threads:
+        thread.join(max(end - time.time(), 0))
+        health = None
+        if not thread.is_alive():
+            health = _cached(block_device, now)
+        if health is None:
+            LOG.warning("Health of %s not collected within %ss",
+                        block_device.name, deadline)
+            health = DiskHealth(block_device.name,
+                                serial=block_device.serial,
+                                status='timeout')
+        results[block_device.name] = health
+
+    return [results[block_device.name] for block_device in block_devices]
+
+
+def clear_cache():
+    with _cache_lock:
+        _cache.clear()
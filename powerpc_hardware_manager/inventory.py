@@ -0,0 +1,219 @@
+# Copyright 2016 International Business Machines
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+#
+# Compact, delta-encoded inventory payloads.
+#
+# The inventory from list_hardware_info is turned into plain JSON types and
+# every top level section (cpu, disks, interfaces, ...) is hashed over its
+# canonical form: sorted keys, no whitespace.  A payload then carries:
+#
+#   {"version": 1,
+#    "hash": <hash over all section hashes>,
+#    "strings": [<strings used more than once>],
+#    "sections": {"cpu": {"hash": ..., "data": ...},
+#                 "disks": {"hash": ...}}}
+#
+# Sections whose hash matches the last acknowledged inventory are sent as
+# a bare hash reference.  Repeated strings (disk models, vendors, driver
+# names, ...) are replaced by "#<index>" into the string table, and
+# strings that really start with "#" are escaped as "##".  Optionally the
+# whole payload is zlib compressed and base64 encoded.
+#
+
+import base64
+import hashlib
+import json
+import zlib
+
+import six
+
+VERSION = 1
+ENCODING_ZLIB = "zlib+base64"
+
+# Shorter strings are cheaper inline than as a reference
+MIN_SHARED_LENGTH = 4
+
+
+class InventoryDecodeError(Exception):
+    """Raised when a payload cannot be turned back into an inventory."""
+
+
+def to_primitive(obj):
+    """Turn IPA's Serializable objects and their containers into JSON types."""
+    if hasattr(obj, 'serialize'):
+        obj = obj.serialize()
+    if isinstance(obj, dict):
+        return dict((six.text_type(key), to_primitive(value))
+                    for (key, value) in obj.items())
+    if isinstance(obj, (list, tuple)):
+        return [to_primitive(value) for value in obj]
+    if isinstance(obj, six.binary_type):
+        return obj.decode('utf-8')
+    return obj
+
+
+def canonical(data):
+    return json.dumps(data, sort_keys=True, separators=(',', ':'))
+
+
+def content_hash(data):
+    return hashlib.sha256(canonical(data).encode('utf-8')).hexdigest()
+
+
+def section_hashes(inventory):
+    """Return {section: hash} for an inventory, as used for acknowledging."""
+    inventory = to_primitive(inventory)
+    return dict((name, content_hash(data))
+                for (name, data) in inventory.items())
+
+
+def _overall_hash(hashes):
+    return content_hash(sorted(hashes.items()))
+
+
+def _count_strings(data, counts):
+    if isinstance(data, dict):
+        for value in data.values():
+            _count_strings(value, counts)
+    elif isinstance(data, list):
+        for value in data:
+            _count_strings(value, counts)
+    elif isinstance(data, six.string_types):
+        if len(data) >= MIN_SHARED_LENGTH:
+            counts[data] = counts.get(data, 0) + 1
+
+
+def _share_strings(data, index):
+    if isinstance(data, dict):
+        return dict((key, _share_strings(value, index))
+                    for (key, value) in data.items())
+    if isinstance(data, list):
+        return [_share_strings(value, index) for value in data]
+    if isinstance(data, six.string_types):
+        if data in index:
+            return "#%d" % index[data]
+        if data.startswith("#"):
+            return "#" + data
+    return data
+
+
+def _expand_strings(data, strings):
+    if isinstance(data, dict):
+        return dict((key, _expand_strings(value, strings))
+                    for (key, value) in data.items())
+    if isinstance(data, list):
+        return [_expand_strings(value, strings) for value in data]
+    if isinstance(data, six.string_types) and data.startswith("#"):
+        if data.startswith("##"):
+            return data[1:]
+        try:
+            return strings[int(data[1:])]
+        except (ValueError, IndexError):
+            raise InventoryDecodeError("Bad string reference %s" % data)
+    return data
+
+
+def encode(inventory, acknowledged=None, compress=False):
+    """Build a compact payload for an inventory.
+
+    :param inventory: the dictionary from list_hardware_info
+    :param acknowledged: {section: hash} of the inventory the receiver
+        last acknowledged, or None to send every section in full
+    :param compress: zlib compress and base64 encode the payload
+    :return: the payload as a dictionary
+    """
+    inventory = to_primitive(inventory)
+    acknowledged = acknowledged or {}
+    hashes = dict((name, content_hash(data))
+                  for (name, data) in inventory.items())
+
+    changed = dict((name, data) for (name, data) in inventory.items()
+                   if acknowledged.get(name) != hashes[name])
+
+    counts = {}
+    _count_strings(changed, counts)
+    # Sorted, so equal inventories always give byte-identical payloads
+    strings = sorted(s for (s, count) in counts.items() if count > 1)
+    index = dict((s, idx) for (idx, s) in enumerate(strings))
+
+    sections = {}
+    for (name, digest) in hashes.items():
+        sections[name] = {"hash": digest}
+        if name in changed:
+            sections[name]["data"] = _share_strings(changed[name], index)
+
+    payload = {"version": VERSION,
+               "hash": _overall_hash(hashes),
+               "strings": strings,
+               "sections": sections}
+
+    if compress:
+        packed = zlib.compress(canonical(payload).encode('utf-8'), 9)
+        return {"version": VERSION,
+                "hash": payload["hash"],
+                "encoding": ENCODING_ZLIB,
+                "payload": base64.b64encode(packed).decode('ascii')}
+
+    return payload
+
+
+def decode_envelope(payload):
+    """Undo the optional compression of a payload made by encode."""
+    if payload.get("encoding") is None:
+        return payload
+    if payload["encoding"] != ENCODING_ZLIB:
+        raise InventoryDecodeError("Unsupported encoding %s"
+                                   % payload["encoding"])
+    try:
+        packed = base64.b64decode(payload["payload"])
+        return json.loads(zlib.decompress(packed).decode('utf-8'))
+    except (KeyError, TypeError, ValueError, zlib.error) as e:
+        raise InventoryDecodeError("Cannot unpack payload: %s" % e)
+
+
+def decode(payload, acknowledged_inventory=None):
+    """Turn a payload back into a plain inventory.
+
+    :param payload: a dictionary made by encode
+    :param acknowledged_inventory: the plain inventory the sender's hash
+        references point to, required when the payload is a delta
+    :raises InventoryDecodeError: if the payload is malformed or refers to
+        sections that are not in acknowledged_inventory
+    :return: the inventory as a dictionary of JSON types
+    """
+    payload = decode_envelope(payload)
+
+    if payload.get("version") != VERSION:
+        raise InventoryDecodeError("Unsupported payload version %s"
+                                   % payload.get("version"))
+
+    acknowledged_inventory = to_primitive(acknowledged_inventory or {})
+    strings = payload.get("strings", [])
+    inventory = {}
+
+    for (name, section) in payload.get("sections", {}).items():
+        if "data" in section:
+            inventory[name] = _expand_strings(section["data"], strings)
+        elif name in acknowledged_inventory:
+            inventory[name] = acknowledged_inventory[name]
+        else:
+            raise InventoryDecodeError("Section %s refers to an unknown "
+                                       "inventory" % name)
+
+        if content_hash(inventory[name]) != section["hash"]:
+            raise InventoryDecodeError("Section %s does not match its "
+                                       "hash" % name)
+
+    return inventory
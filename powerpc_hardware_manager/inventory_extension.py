@@ -0,0 +1,76 @@
+# Copyright 2016 International Business Machines
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+#
+# Agent extension serving the compact inventory payloads of
+# powerpc_hardware_manager.inventory over the IPA command API.
+#
+# A receiver (Ironic, Inspector or any collector talking to the agent)
+# asks for a payload, stores the inventory decoded from it and then
+# acknowledges it, so the next payload only carries changed sections:
+#
+#   POST /v1/commands/?wait=true
+#   {"name": "powerpc_inventory.get_inventory_payload",
+#    "params": {"compress": true}}
+#
+#   POST /v1/commands/?wait=true
+#   {"name": "powerpc_inventory.acknowledge_inventory",
+#    "params": {"payload": <the payload, or just its section hashes>}}
+#
+# The calls go through hardware.dispatch_to_managers, so they reach the
+# agent's own PowerPCHardwareManager instance and its acknowledged state.
+#
+
+from oslo_log import log
+
+from ironic_python_agent import errors
+from ironic_python_agent.extensions import base
+from ironic_python_agent import hardware
+
+from powerpc_hardware_manager import inventory
+
+LOG = log.getLogger()
+
+
+class PowerPCInventoryExtension(base.BaseAgentExtension):
+
+    @base.sync_command('get_inventory_payload')
+    def get_inventory_payload(self, compress=False, delta=True):
+        """Return the inventory as a compact, hashed payload.
+
+        :param compress: zlib compress and base64 encode the payload
+        :param delta: send sections the receiver acknowledged as hash
+            references only
+        """
+        return hardware.dispatch_to_managers('get_inventory_payload',
+                                             compress=compress,
+                                             delta=delta)
+
+    @base.sync_command('acknowledge_inventory')
+    def acknowledge_inventory(self, payload=None):
+        """Record that the receiver stored the inventory of payload.
+
+        :param payload: a payload from get_inventory_payload, compressed
+            or not.  {"sections": {name: {"hash": ...}}} is enough.
+        """
+        if not isinstance(payload, dict):
+            raise errors.InvalidCommandParamsError(
+                'acknowledge_inventory needs the payload as a dictionary')
+        try:
+            hardware.dispatch_to_managers('acknowledge_inventory', payload)
+        except (inventory.InventoryDecodeError, KeyError, TypeError,
+                ValueError) as e:
+            raise errors.InvalidCommandParamsError(
+                'Malformed inventory payload: %s' % e)
+        LOG.debug("Inventory acknowledged: %s", payload.get("hash"))
@@ -0,0 +1,194 @@
+# Copyright 2016 International Business Machines
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+#
+# Per DIMM and per NUMA node memory inventory, read straight out of the
+# flattened device tree and sysfs without forking anything.
+#
+# On OPAL systems:
+#
+#   /proc/device-tree/memory@<base>/reg             base and size of the
+#   /proc/device-tree/memory@<base>/ibm,chip-id     range, and its chip
+#   /proc/device-tree/vpd/.../dimm@<id>/            one node per DIMM with
+#       ibm,loc-code, size, part-number,            its VPD
+#       serial-number, ibm,chip-id
+#   /sys/devices/system/node/node<N>/meminfo        per node totals
+#
+# Every table is stored column wise in arrays, one entry per DIMM, range
+# or node, which keeps the structure small on machines with many DIMMs.
+#
+
+import array
+import os
+import re
+
+from oslo_log import log
+
+from ironic_python_agent import encoding
+
+from powerpc_hardware_manager import sysfs
+
+LOG = log.getLogger()
+
+NODE_MEMTOTAL_RE = re.compile(r'^Node\s+\d+\s+MemTotal:\s+(\d+)\s+kB',
+                              re.MULTILINE)
+
+
+def _join_cells(cells):
+    result = 0
+    for cell in cells:
+        result = (result << 32) | cell
+    return result
+
+
+class MemoryLayout(encoding.SerializableComparable):
+    serializable_fields = ('dimms', 'ranges', 'numa_nodes')
+
+    def __init__(self):
+        # DIMMs
+        self.dimm_location = []
+        self.dimm_part_number = []
+        self.dimm_serial = []
+        self.dimm_size_mb = array.array('l')
+        self.dimm_chip_id = array.array('l')
+        # memory@ ranges
+        # unsigned long is 64 bits on ppc64, python 2 has no 'Q'
+        self.range_base = array.array('L')
+        self.range_size_mb = array.array('l')
+        self.range_chip_id = array.array('l')
+        # NUMA nodes
+        self.node_id = array.array('l')
+        self.node_total_mb = array.array('l')
+
+    def add_dimm(self, location, size_mb, chip_id, part_number, serial):
+        self.dimm_location.append(location)
+        self.dimm_size_mb.append(size_mb if size_mb is not None else -1)
+        self.dimm_chip_id.append(chip_id if chip_id is not None else -1)
+        self.dimm_part_number.append(part_number)
+        self.dimm_serial.append(serial)
+
+    def add_range(self, base, size_mb, chip_id):
+        self.range_base.append(base)
+        self.range_size_mb.append(size_mb)
+        self.range_chip_id.append(chip_id if chip_id is not None else -1)
+
+    def add_node(self, node_id, total_mb):
+        self.node_id.append(node_id)
+        self.node_total_mb.append(total_mb)
+
+    @property
+    def dimms(self):
+        return {'location': list(self.dimm_location),
+                'size_mb': self.dimm_size_mb.tolist(),
+                'chip_id': self.dimm_chip_id.tolist(),
+                'part_number': list(self.dimm_part_number),
+                'serial': list(self.dimm_serial)}
+
+    @property
+    def ranges(self):
+        return {'base': self.range_base.tolist(),
+                'size_mb': self.range_size_mb.tolist(),
+                'chip_id': self.range_chip_id.tolist()}
+
+    @property
+    def numa_nodes(self):
+        return {'node': self.node_id.tolist(),
+                'total_mb': self.node_total_mb.tolist()}
+
+    @property
+    def total_mb(self):
+        """Memory in all memory@ ranges, 0 without a device tree."""
+        return sum(self.range_size_mb)
+
+
+def _collect_ranges(layout, device_tree):
+    address_cells = sysfs.cells(sysfs.read_file(
+        os.path.join(device_tree, '#address-cells'))) or [2]
+    size_cells = sysfs.cells(sysfs.read_file(
+        os.path.join(device_tree, '#size-cells'))) or [2]
+    stride = address_cells[0] + size_cells[0]
+
+    for name in sorted(os.listdir(device_tree)):
+        if not name.startswith('memory@'):
+            continue
+        path = os.path.join(device_tree, name)
+        chip_id = sysfs.int_property(sysfs.read_file(
+            os.path.join(path, 'ibm,chip-id')))
+        reg = sysfs.cells(sysfs.read_file(os.path.join(path, 'reg')))
+        for idx in range(0, len(reg) - stride + 1, stride):
+            base = _join_cells(reg[idx:idx + address_cells[0]])
+            size = _join_cells(reg[idx + address_cells[0]:idx + stride])
+            layout.add_range(base, size >> 20, chip_id)
+
+
+def _collect_dimms(layout, device_tree):
+    vpd = os.path.join(device_tree, 'vpd')
+    if not os.path.isdir(vpd):
+        return
+
+    for (dirpath, dirnames, _) in os.walk(vpd):
+        dirnames.sort()
+        if not os.path.basename(dirpath).startswith('dimm@'):
+            continue
+
+        def prop(name):
+            return sysfs.read_file(os.path.join(dirpath, name))
+
+        location = sysfs.string_property(prop('ibm,loc-code'))
+        if location is None:
+            location = os.path.relpath(dirpath, vpd)
+        layout.add_dimm(location,
+                        sysfs.int_property(prop('size')),
+                        sysfs.int_property(prop('ibm,chip-id')),
+                        sysfs.string_property(prop('part-number')),
+                        sysfs.string_property(prop('serial-number')))
+
+
+def _collect_nodes(layout, sys_path):
+    node_path = os.path.join(sys_path, 'devices', 'system', 'node')
+    try:
+        names = os.listdir(node_path)
+    except OSError:
+        return
+
+    nodes = sorted(int(name[4:]) for name in names
+                   if name.startswith('node') and name[4:].isdigit())
+    for node in nodes:
+        meminfo = sysfs.read_file(os.path.join(node_path, 'node%d' % node,
+                                               'meminfo'))
+        match = NODE_MEMTOTAL_RE.search((meminfo or b'').decode('ascii'))
+        if match is None:
+            LOG.warning("No MemTotal for NUMA node %d", node)
+            continue
+        layout.add_node(node, int(match.group(1)) // 1024)
+
+
+def collect_memory_layout(sys_path='/sys', device_tree='/proc/device-tree'):
+    """Read the DIMM, memory range and NUMA node layout.
+
+    :param sys_path: where sysfs is mounted
+    :param device_tree: where the flattened device tree is exposed
+    :return: a MemoryLayout, with empty tables for whatever is missing
+    """
+    layout = MemoryLayout()
+
+    if os.path.isdir(device_tree):
+        _collect_ranges(layout, device_tree)
+        _collect_dimms(layout, device_tree)
+    else:
+        LOG.debug("No device tree at %s", device_tree)
+
+    _collect_nodes(layout, sys_path)
+
+    return layout
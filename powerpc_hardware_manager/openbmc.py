@@ -0,0 +1,351 @@
+# Copyright 2016 International Business Machines
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+#
+# A small client for the OpenBMC REST API.
+#
+# OpenBMC REST API
+# https://github.com/openbmc/docs/blob/master/rest-api.md
+#
+# This is the importable counterpart of tools/openBmcTool.py.  A client
+# holds one requests.Session with a keep-alive connection pool, so after
+# the first login every call reuses the same TLS connection.
+#
+
+import collections
+import json
+import numbers
+
+import requests
+from requests.packages.urllib3.exceptions import InsecureRequestWarning
+from requests.packages.urllib3.util.retry import Retry
+
+from oslo_log import log
+
+LOG = log.getLogger()
+
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+# (connect, read) in seconds.  The connect timeout is kept short, and
+# probe() does not retry, so probing an address without an OpenBMC gives
+# up after one connect timeout.
+DEFAULT_TIMEOUT = (3.05, 30)
+DEFAULT_RETRIES = 3
+DEFAULT_POOL_SIZE = 4
+
+CONTROL_PATH = "org/openbmc/control"
+INVENTORY_PATH = "org/openbmc/inventory/system"
+FIRMWARE_PATH = "org/openbmc/inventory/system/bios"
+NETWORK_PATH = "org/openbmc/NetworkManager/Interface"
+SENSORS_PATH = "org/openbmc/sensors"
+BOOT_PROGRESS_PATH = "org/openbmc/sensors/host/BootProgress"
+
+PowerState = collections.namedtuple(
+    'PowerState', ['ident', 'power_url', 'chassis_url', 'state', 'pgood'])
+
+Dimm = collections.namedtuple(
+    'Dimm', ['path', 'model', 'serial', 'manufacturer'])
+
+Sensor = collections.namedtuple('Sensor', ['path', 'value', 'units'])
+
+
+class OpenBMCError(Exception):
+    """Raised when the BMC refuses or fails a REST request."""
+
+    def __init__(self, message, status_code=None):
+        super(OpenBMCError, self).__init__(message)
+        self.status_code = status_code
+
+
+class OpenBMCClient(object):
+    """A keep-alive, retrying session against one OpenBMC.
+
+    :param hostname: address of the BMC
+    :param username: BMC user
+    :param password: BMC password
+    :param timeout: (connect, read) timeout applied to every request
+    :param retries: how often idempotent requests are retried on
+        connection errors and 502/503/504 answers
+    :param pool_maxsize: number of pooled connections to the BMC
+    :param verify: TLS verification, OpenBMC ships self signed certificates
+    """
+
+    def __init__(self, hostname, username, password,
+                 timeout=DEFAULT_TIMEOUT, retries=DEFAULT_RETRIES,
+                 pool_maxsize=DEFAULT_POOL_SIZE, verify=False):
+        self.hostname = hostname
+        self.username = username
+        self.password = password
+        self.timeout = timeout
+        self.verify = verify
+        self.logged_in = False
+
+        if not verify:
+            requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
+
+        self.retries = retries
+        self.adapter = requests.adapters.HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=pool_maxsize,
+            max_retries=self._retry(retries))
+
+        self.session = requests.Session()
+        self.session.headers.update(JSON_HEADERS)
+        self.session.mount("https://", self.adapter)
+
+    @staticmethod
+    def _retry(retries):
+        # POST is not in the default retry whitelist, so actions such as
+        # powerOn are never sent twice.
+        return Retry(total=retries,
+                     connect=retries,
+                     read=retries,
+                     backoff_factor=0.2,
+                     status_forcelist=(502, 503, 504))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def url(self, path):
+        return "https://%s/%s" % (self.hostname, path.lstrip("/"), )
+
+    def close(self):
+        self.session.close()
+        self.logged_in = False
+
+    def login(self):
+        # Log in with a special URL and JSON data structure
+        login_data = json.dumps({"data": [self.username, self.password]})
+        response = self._send("POST", "login", login_data)
+
+        if response.status_code != 200:
+            raise OpenBMCError("Response code to login is not 200! (%d)"
+                               % (response.status_code, ),
+                               response.status_code)
+
+        self.logged_in = True
+
+    def get(self, path):
+        return self._request("GET", path)
+
+    def post(self, path, data=None):
+        if data is None:
+            data = []
+        return self._request("POST", path, json.dumps({"data": data}))
+
+    def enumerate(self, path):
+        return self.get("%s/enumerate" % (path.rstrip("/"), ))
+
+    def _send(self, method, path, data=None):
+        try:
+            return self.session.request(method,
+                                        self.url(path),
+                                        data=data,
+                                        verify=self.verify,
+                                        timeout=self.timeout)
+        except requests.RequestException as e:
+            raise OpenBMCError("%s %s failed: %s" % (method, path, e))
+
+    def _request(self, method, path, data=None):
+        if not self.logged_in:
+            self.login()
+
+        response = self._send(method, path, data)
+
+        # The session cookie expired, log in once more and retry
+        if response.status_code == 401:
+            LOG.debug("OpenBMC %s: session expired, logging in again",
+                      self.hostname)
+            self.login()
+            response = self._send(method, path, data)
+
+        if response.status_code != 200:
+            raise OpenBMCError("Response code to %s %s is not 200! (%d)"
+                               % (method, path, response.status_code, ),
+                               response.status_code)
+
+        try:
+            return response.json()["data"]
+        except (ValueError, KeyError) as e:
+            raise OpenBMCError("Malformed response to %s %s: %s"
+                               % (method, path, e))
+
+    def get_power_states(self):
+        """Return a PowerState for every power/chassis control pair."""
+        filter_list = ["/power", "/chassis"]
+        mappings = {}
+
+        for (item_key, item_value) in self.enumerate(CONTROL_PATH).items():
+            for fltr in filter_list:
+                idx = item_key.find(fltr)
+                if idx > -1:
+                    # Get the identity (the rest of the string)
+                    ident = item_key[idx + len(fltr):]
+                    mappings.setdefault(ident, {})[fltr] = (item_key,
+                                                            item_value)
+
+        states = []
+        for ident in sorted(mappings):
+            ident_mappings = mappings[ident]
+            if "/power" not in ident_mappings:
+                continue
+            if "/chassis" not in ident_mappings:
+                continue
+
+            (power_url, power_mapping) = ident_mappings["/power"]
+            (chassis_url, _) = ident_mappings["/chassis"]
+
+            states.append(PowerState(ident=ident,
+                                     power_url=power_url,
+                                     chassis_url=chassis_url,
+                                     state=power_mapping.get("state"),
+                                     pgood=power_mapping.get("pgood")))
+
+        if not states:
+            raise OpenBMCError("There is no power control under /%s"
+                               % (CONTROL_PATH, ))
+
+        return states
+
+    def is_power_on(self):
+        return all(s.state == 1 for s in self.get_power_states())
+
+    def set_power(self, on):
+        """Switch the chassis power.
+
+        :returns: True if a power action was sent, False if every chassis
+            was already in the requested state.
+        """
+        action = "powerOn" if on else "powerOff"
+        changed = False
+
+        for power_state in self.get_power_states():
+            if bool(power_state.state == 1) == bool(on):
+                continue
+            self.post("%s/action/%s" % (power_state.chassis_url, action, ))
+            changed = True
+
+        return changed
+
+    def get_boot_progress(self):
+        return self.post("%s/action/getValue" % (BOOT_PROGRESS_PATH, ))
+
+    def get_dimms(self):
+        """Return the present, non faulty DIMMs with a model number."""
+        dimms = []
+
+        for (item_key, item_value) in self.enumerate(INVENTORY_PATH).items():
+            # We only care about dimm entries
+            if item_key.find("/dimm") == -1:
+                continue
+            if item_key.endswith("/event"):
+                continue
+            if item_value.get("present") == "False":
+                continue
+            if item_value.get("fault") == "True":
+                continue
+            if "Model Number" not in item_value:
+                continue
+
+            dimms.append(Dimm(path=item_key,
+                              model=item_value["Model Number"].strip(),
+                              serial=item_value.get("Serial Number"),
+                              manufacturer=item_value.get("Manufacturer")))
+
+        return sorted(dimms)
+
+    def get_sensors(self):
+        """Return every numeric sensor, such as temperatures, fans and power.
+
+        Sensors with a text value (BootProgress, OperatingSystemStatus, ...)
+        and sensors reporting an error are left out.
+        """
+        sensors = []
+
+        for (item_key, item_value) in self.enumerate(SENSORS_PATH).items():
+            if not isinstance(item_value, dict):
+                continue
+            value = item_value.get("value")
+            if isinstance(value, bool) or not isinstance(value,
+                                                         numbers.Real):
+                continue
+            if item_value.get("error"):
+                continue
+
+            sensors.append(Sensor(path=item_key,
+                                  value=value,
+                                  units=item_value.get("units") or ""))
+
+        return sorted(sensors)
+
+    def get_firmware_version(self):
+        """Return the system firmware version from the FRU inventory.
+
+        This is the REST equivalent of the "Product Version" field in the
+        "System Firmware" section of ipmitool fru.
+        """
+        bios = self.get(FIRMWARE_PATH)
+        version = bios.get("Version")
+        if version:
+            return version.strip()
+        return None
+
+    def get_bmc_address(self, interface="eth0"):
+        """Return the first IPv4 address configured on the BMC LAN."""
+        data = self.post("%s/action/GetAddress4" % (NETWORK_PATH, ),
+                         [interface])
+
+        # [[[family, prefix_len, flags, address], ...], gateway, ...]
+        try:
+            for entry in data[0]:
+                address = entry[-1]
+                if address.count(".") == 3:
+                    return address
+        except (IndexError, TypeError, AttributeError):
+            LOG.warning("Malformed GetAddress4 data from %s: %s",
+                        self.hostname, data)
+
+        return None
+
+
+def probe(hostname, username, password, **kwargs):
+    """Return a logged in client if hostname is an OpenBMC.
+
+    The login is not retried, see DEFAULT_TIMEOUT.  The returned client
+    retries later requests as configured by kwargs.
+
+    :returns: the client, or None when the BMC answered the login with
+        anything but 200 or a 5xx, i.e. it is not an OpenBMC or refuses
+        the credentials
+    :raises OpenBMCError: when the BMC could not be reached or answered
+        with a 5xx, which says nothing about what it runs
+    """
+    client = OpenBMCClient(hostname, username, password, **kwargs)
+    # Swap the retries of the mounted adapter instead of mounting another
+    # one, so the connection of the login stays in the pool
+    client.adapter.max_retries = client._retry(0)
+    try:
+        client.login()
+    except OpenBMCError as e:
+        client.close()
+        if e.status_code is None or e.status_code >= 500:
+            raise
+        LOG.debug("%s does not look like an OpenBMC: %s", hostname, e)
+        return None
+    finally:
+        client.adapter.max_retries = client._retry(client.retries)
+    return client
@@ -0,0 +1,283 @@
+# Copyright 2016 International Business Machines
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+#
+# PCI device inventory: GPUs, NVLink bridges, CAPI/OpenCAPI adapters,
+# NVMe controllers, NICs, ...
+#
+# Everything comes from one pass over /sys/bus/pci/devices:
+#
+#   <address>/{vendor,device,subsystem_vendor,subsystem_device,class}
+#   <address>/numa_node
+#   <address>/{current,max}_link_{speed,width}
+#   <address>/driver -> .../drivers/<name>
+#
+# Names are looked up in pci.ids next to this module instead of forking
+# lspci.  The table is parsed into dictionaries on the first lookup.
+#
+
+import os
+import threading
+
+from oslo_log import log
+
+from ironic_python_agent import encoding
+
+from powerpc_hardware_manager import sysfs
+
+LOG = log.getLogger()
+
+PCI_IDS = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                       'pci.ids')
+
+VENDOR_IBM = 0x1014
+VENDOR_NVIDIA = 0x10de
+VENDOR_AMD = 0x1002
+
+CLASS_NVME = 0x0108
+CLASS_3D = 0x0302
+CLASS_OTHER_BRIDGE = 0x0680
+CLASS_ACCELERATOR = 0x1200
+
+# Base class -> kind, for devices not matched more specifically
+BASE_CLASS_KINDS = {
+    0x01: 'storage',
+    0x02: 'network',
+    0x03: 'display',
+    0x06: 'bridge',
+    0x0c: 'serial_bus',
+}
+
+# Driver -> kind
+DRIVER_KINDS = {
+    'cxl': 'capi',
+    'ocxl': 'opencapi',
+}
+
+_table = None
+_table_lock = threading.Lock()
+
+try:
+    _scandir = os.scandir
+except AttributeError:
+    try:
+        from scandir import scandir as _scandir
+    except ImportError:
+        _scandir = None
+
+
+class PciIdTable(object):
+    """Vendor, device and class names from a pci.ids file."""
+
+    def __init__(self):
+        self.vendors = {}
+        self.devices = {}
+        self.classes = {}
+        self.subclasses = {}
+
+    def load(self, path):
+        vendor = None
+        klass = None
+        with open(path, 'rb') as f:
+            for line in f:
+                line = line.decode('utf-8', 'replace').rstrip('\r\n')
+                if not line or line.startswith('#'):
+                    continue
+                try:
+                    if line.startswith('\t\t'):
+                        # Subsystems and programming interfaces
+                        continue
+                    if line.startswith('\t'):
+                        (ident, name) = line.strip().split(None, 1)
+                        if klass is not None:
+                            self.subclasses[(klass, int(ident, 16))] = name
+                        elif vendor is not None:
+                            self.devices[(vendor, int(ident, 16))] = name
+                    elif line.startswith('C '):
+                        (_, ident, name) = line.split(None, 2)
+                        klass = int(ident, 16)
+                        vendor = None
+                        self.classes[klass] = name
+                    else:
+                        (ident, name) = line.split(None, 1)
+                        vendor = int(ident, 16)
+                        klass = None
+                        self.vendors[vendor] = name
+                except ValueError:
+                    # Device lists end at the first unknown section
+                    # (pci.ids has 'X' and 'L' tables after the classes)
+                    vendor = None
+                    klass = None
+        return self
+
+    def vendor_name(self, vendor):
+        return self.vendors.get(vendor)
+
+    def device_name(self, vendor, device):
+        return self.devices.get((vendor, device))
+
+    def class_name(self, class_code):
+        """The subclass name of a 16 bit class code, else the class name."""
+        return (self.subclasses.get((class_code >> 8, class_code & 0xff)) or
+                self.classes.get(class_code >> 8))
+
+
+def get_pci_id_table(path=PCI_IDS):
+    """Return the parsed pci.ids table, loading it on the first call."""
+    global _table
+
+    with _table_lock:
+        if _table is None:
+            try:
+                _table = PciIdTable().load(path)
+            except (IOError, OSError) as e:
+                LOG.warning("Cannot read PCI IDs from %s: %s", path, e)
+                _table = PciIdTable()
+        return _table
+
+
+class PciDevice(encoding.SerializableComparable):
+    serializable_fields = ('address', 'vendor_id', 'device_id',
+                           'subsystem_vendor_id', 'subsystem_device_id',
+                           'class_id', 'vendor', 'product', 'class_name',
+                           'kind', 'numa_node', 'link_speed', 'link_width',
+                           'max_link_speed', 'max_link_width', 'driver')
+    __slots__ = serializable_fields
+
+    def __init__(self, address, vendor_id=None, device_id=None,
+                 subsystem_vendor_id=None, subsystem_device_id=None,
+                 class_id=None, vendor=None, product=None, class_name=None,
+                 kind=None, numa_node=None, link_speed=None,
+                 link_width=None, max_link_speed=None, max_link_width=None,
+                 driver=None):
+        self.address = address
+        self.vendor_id = vendor_id
+        self.device_id = device_id
+        self.subsystem_vendor_id = subsystem_vendor_id
+        self.subsystem_device_id = subsystem_device_id
+        self.class_id = class_id
+        self.vendor = vendor
+        self.product = product
+        self.class_name = class_name
+        self.kind = kind
+        self.numa_node = numa_node
+        self.link_speed = link_speed
+        self.link_width = link_width
+        self.max_link_speed = max_link_speed
+        self.max_link_width = max_link_width
+        self.driver = driver
+
+
+def _list_dir(path):
+    """Yield (name, path) of the entries of a directory."""
+    if _scandir is not None:
+        for entry in _scandir(path):
+            yield (entry.name, entry.path)
+    else:
+        for name in os.listdir(path):
+            yield (name, os.path.join(path, name))
+
+
+def _link_speed(value):
+    # "8.0 GT/s PCIe" on newer kernels, "8 GT/s" or "Unknown speed" before
+    if not value or value.startswith('Unknown'):
+        return None
+    return value.replace(' PCIe', '')
+
+
+def _kind(vendor, class_code, driver):
+    if driver in DRIVER_KINDS:
+        return DRIVER_KINDS[driver]
+    if class_code is None:
+        return None
+    if class_code == CLASS_NVME:
+        return 'nvme'
+    if class_code == CLASS_ACCELERATOR:
+        return 'accelerator'
+    if vendor == VENDOR_IBM and class_code == CLASS_OTHER_BRIDGE:
+        # The NPU exposes every NVLink as an IBM "other" bridge
+        return 'nvlink'
+    if class_code >> 8 == 0x03 and (class_code == CLASS_3D or
+                                    vendor in (VENDOR_NVIDIA, VENDOR_AMD)):
+        return 'gpu'
+    return BASE_CLASS_KINDS.get(class_code >> 8)
+
+
+def _hex(value, digits=4):
+    if value is None:
+        return None
+    return '%0*x' % (digits, value)
+
+
+def collect_pci_devices(sys_path='/sys'):
+    """Read every PCI device from sysfs.
+
+    :param sys_path: where sysfs is mounted
+    :return: a list of PciDevice, sorted by address
+    """
+    devices_path = os.path.join(sys_path, 'bus', 'pci', 'devices')
+    try:
+        entries = sorted(_list_dir(devices_path))
+    except OSError as e:
+        LOG.warning("Cannot list PCI devices in %s: %s", devices_path, e)
+        return []
+
+    table = None
+    devices = []
+    for (address, path) in entries:
+        vendor = sysfs.read_int(os.path.join(path, 'vendor'), 16)
+        device = sysfs.read_int(os.path.join(path, 'device'), 16)
+        # 24 bit class, subclass, programming interface
+        class_code = sysfs.read_int(os.path.join(path, 'class'), 16)
+        if class_code is not None:
+            class_code >>= 8
+
+        driver = None
+        driver_link = os.path.join(path, 'driver')
+        if os.path.islink(driver_link):
+            driver = os.path.basename(os.readlink(driver_link))
+
+        numa_node = sysfs.read_int(os.path.join(path, 'numa_node'))
+        if numa_node is not None and numa_node < 0:
+            numa_node = None
+
+        if table is None:
+            table = get_pci_id_table()
+
+        devices.append(PciDevice(
+            address,
+            vendor_id=_hex(vendor),
+            device_id=_hex(device),
+            subsystem_vendor_id=_hex(sysfs.read_int(
+                os.path.join(path, 'subsystem_vendor'), 16)),
+            subsystem_device_id=_hex(sysfs.read_int(
+                os.path.join(path, 'subsystem_device'), 16)),
+            class_id=_hex(class_code),
+            vendor=table.vendor_name(vendor),
+            product=table.device_name(vendor, device),
+            class_name=(table.class_name(class_code)
+                        if class_code is not None else None),
+            kind=_kind(vendor, class_code, driver),
+            numa_node=numa_node,
+            link_speed=_link_speed(sysfs.read_string(os.path.join(
+                path, 'current_link_speed'))),
+            link_width=sysfs.read_int(os.path.join(path,
+                                                   'current_link_width')),
+            max_link_speed=_link_speed(sysfs.read_string(os.path.join(
+                path, 'max_link_speed'))),
+            max_link_width=sysfs.read_int(os.path.join(path,
+                                                       'max_link_width')),
+            driver=driver))
+
+    return devices
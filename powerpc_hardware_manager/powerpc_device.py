@@ -12,10 +12,16 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+# IPA imports every hardware manager at startup, also on machines where
+# evaluate_hardware_support declines it, so modules only some collectors
+# or clean steps need (pyudev, netifaces, shlex, requests through openbmc,
+# ...) are imported where they are used.  tools/checkImportTime.py keeps
+# the import of this module within budget.
+
 import os
-import pyudev
-import shlex
-import netifaces
+import re
+import threading
+import time
 
 from oslo_log import log
 
@@ -32,8 +38,17 @@ from ironic_python_agent.hardware import Memory
 from ironic_python_agent.hardware import NetworkInterface
 from ironic_python_agent.hardware import SystemVendorInfo
 
+from powerpc_hardware_manager import cpu_topology
+from powerpc_hardware_manager import inventory
+from powerpc_hardware_manager import memory_layout
+from powerpc_hardware_manager import pci_devices
+from powerpc_hardware_manager import probe_cache
+
 LOG = log.getLogger()
 
+# A PCI address such as 0001:0a:00.0
+PCI_ADDRESS_RE = re.compile(r'^[0-9a-f]{4}:[0-9a-f]{2}:[0-9a-f]{2}\.[0-7]$')
+
 def _get_device_vendor(dev):
     """Get the vendor name of a given device."""
     try:
@@ -43,6 +58,21 @@ def _get_device_vendor(dev):
     except IOError:
         LOG.warning("Can't find the device vendor for device %s", dev)
 
+def _get_device_controller(dev, sys_path='/sys'):
+    """Get the PCI address of the controller a block device is attached to.
+
+    This is the last PCI device on the sysfs path of the block device, so
+    for a SAS or SATA disk it is the HBA and for NVMe the drive itself.
+    """
+    devname = os.path.basename(dev)
+    path = os.path.realpath('{0}/class/block/{1}/device'.format(sys_path,
+                                                                devname))
+    controller = None
+    for part in path.split('/'):
+        if PCI_ADDRESS_RE.match(part):
+            controller = part
+    return controller or 'unknown'
+
 def _udev_settle():
     """Wait for the udev event queue to settle.
 
@@ -70,6 +100,9 @@ def list_all_block_devices(block_type='disk'):
     :param block_type: Type of block device to find
     :return: A list of BlockDevices
     """
+    import pyudev
+    import shlex
+
     _udev_settle()
 
     columns = ['KNAME', 'MODEL', 'SIZE', 'ROTA', 'TYPE']
@@ -130,9 +163,33 @@ class PowerPCHardwareManager(hardware.HardwareManager):
     HARDWARE_MANAGER_VERSION = "1"
     SYSTEM_FIRMWARE_VERSION = "IBM-habanero-ibm-OP8_v1.7_1.62"
     SYSTEM_FIRMWARE_FILE = "/root/8348_810.1603.20160310b_update.hpm"
+    # Devices erased at once behind one HBA or PCI parent, and in total
+    ERASE_CONTROLLER_CONCURRENCY = 4
+    ERASE_MAX_CONCURRENCY = 32
+    # Seconds the disk health section of the inventory may take
+    DISK_HEALTH_DEADLINE = 30
+    # Seconds the results of lscpu, lsblk, lshw and ipmitool probes are
+    # shared between callers, see probe_cache
+    PROBE_CACHE_TTL = 10
+    # Burn-in expectations, see powerpc_hardware_manager.burnin.evaluate.
+    # Nodes can override them with extra/burnin_thresholds and
+    # extra/burnin_tolerance.
+    BURNIN_THRESHOLDS = {
+        'memory': {},
+        'disks': {},
+    }
 
     def __init__(self):
         self.sys_path = '/sys'
+        self.device_tree_path = '/proc/device-tree'
+        # (address, username) -> logged in OpenBMCClient, or None when the
+        # BMC did not answer like an OpenBMC
+        self._openbmc_clients = {}
+        self._openbmc_lock = threading.Lock()
+        # {section: hash} of the last inventory the receiver acknowledged
+        self._acknowledged_inventory = None
+        # Results of the last burnin_powerpc_node step
+        self._burnin_results = None
 
     def evaluate_hardware_support(self):
         """Declare level of hardware support provided.
@@ -162,20 +219,57 @@ class PowerPCHardwareManager(hardware.HardwareManager):
         hardware_info = {}
         hardware_info['interfaces'] = self.list_network_interfaces()
         hardware_info['cpu'] = self.get_cpus()
+        hardware_info['cpu_topology'] = self.get_cpu_topology()
         hardware_info['disks'] = self.list_block_devices()
+        if self._collect_disk_health():
+            hardware_info['disk_health'] = self.get_disk_health(
+                hardware_info['disks'])
         hardware_info['memory'] = self.get_memory()
+        hardware_info['memory_layout'] = self.get_memory_layout()
+        hardware_info['pci_devices'] = self.list_pci_devices()
         hardware_info['bmc_address'] = self.get_bmc_address()
         hardware_info['system_vendor'] = self.get_system_vendor_info()
         hardware_info['boot'] = self.get_boot_info()
+        if self._burnin_results is not None:
+            hardware_info['burnin'] = self._burnin_results
+
+        LOG.debug("PowerPCHardwareManager.list_hardware_info: probe cache "
+                  "%s", probe_cache.stats())
 
         return hardware_info
 
+    def get_inventory_payload(self, compress=False, delta=True):
+        """Return the inventory as a compact, hashed payload.
+
+        See powerpc_hardware_manager.inventory for the format.  With delta,
+        sections that did not change since the last acknowledged inventory
+        are sent as hash references only.  Served to receivers by the
+        powerpc_inventory agent extension, see inventory_extension.
+
+        :param compress: zlib compress and base64 encode the payload
+        :param delta: leave out sections the receiver already has
+        :return: the payload as a dictionary
+        """
+        acknowledged = self._acknowledged_inventory if delta else None
+        return inventory.encode(self.list_hardware_info(),
+                                acknowledged=acknowledged,
+                                compress=compress)
+
+    def acknowledge_inventory(self, payload):
+        """Record that the receiver stored the inventory of payload."""
+        if payload.get("encoding") is not None:
+            payload = inventory.decode_envelope(payload)
+        self._acknowledged_inventory = dict(
+            (name, section["hash"])
+            for (name, section) in payload["sections"].items())
+
     def list_network_interfaces(self):
         iface_names = os.listdir('{0}/class/net'.format(self.sys_path))
         iface_names = [name for name in iface_names if self._is_device(name)]
 
         return [self._get_interface_info(name) for name in iface_names]
 
+    @probe_cache.single_flight
     def get_cpus(self):
         func = "PowerPCHardwareManager.get_cpus"
 
@@ -188,6 +282,10 @@ class PowerPCHardwareManager(hardware.HardwareManager):
         # processors
         frequency = cpu_info.get('cpu max mhz', cpu_info.get('cpu mhz'))
 
+        model_name = cpu_info.get('model name')
+        count = int(cpu_info.get('cpu(s)'))
+        architecture = cpu_info.get('architecture')
+
         flags = []
         out = utils.try_execute('grep', '-Em1', '^flags', '/proc/cpuinfo')
         if out:
@@ -197,13 +295,15 @@ class PowerPCHardwareManager(hardware.HardwareManager):
                 flags = out[0].strip().split(':', 1)[1].strip().split()
             except (IndexError, ValueError):
                 LOG.warning('Malformed CPU flags information: %s', out)
+        elif architecture and architecture.startswith('ppc'):
+            # POWER has no flags line, the closest is the cpu line
+            # cpu             : POWER8E (raw), altivec supported
+            LOG.debug('%s: No CPU flags on %s', func, architecture)
+            if model_name and 'altivec supported' in model_name:
+                flags = ['altivec']
         else:
             LOG.warning('Failed to get CPU flags')
 
-        model_name = cpu_info.get('model name')
-        count = int(cpu_info.get('cpu(s)'))
-        architecture = cpu_info.get('architecture')
-
         LOG.debug("%s: model_name = %s", func, model_name)
         LOG.debug("%s: frequency = %s", func, frequency)
         LOG.debug("%s: count = %s", func, count)
@@ -217,9 +317,39 @@ class PowerPCHardwareManager(hardware.HardwareManager):
                    architecture=architecture,
                    flags=flags)
 
+    def get_cpu_topology(self):
+        """Return the chip, core, thread and NUMA layout of the CPUs.
+
+        Unlike the count from get_cpus, this tells cores from SMT threads
+        and includes offline threads.
+
+        :return: a CpuTopology
+        """
+        return cpu_topology.collect_cpu_topology(self.sys_path)
+
+    @probe_cache.single_flight
     def list_block_devices(self):
         return list_all_block_devices()
 
+    def get_disk_health(self, block_devices=None):
+        """Return SMART/NVMe health records for the block devices.
+
+        :param block_devices: BlockDevices to check, defaults to all disks
+        :return: a list of DiskHealth
+        """
+        if block_devices is None:
+            block_devices = self.list_block_devices()
+
+        from powerpc_hardware_manager import disk_health
+        return disk_health.collect_disk_health(block_devices,
+                                               self.DISK_HEALTH_DEADLINE)
+
+    def _collect_disk_health(self):
+        # Opt in with ipa-powerpc-disk-health=1 on the kernel command line
+        value = utils.get_agent_params().get('ipa-powerpc-disk-health', '0')
+        return str(value).lower() in ('1', 'true', 'yes', 'on')
+
+    @probe_cache.single_flight
     def get_memory(self):
         func = "PowerPCHardwareManager.get_memory"
         cmd = ("lshw -c memory -short -quiet 2>/dev/null"
@@ -235,13 +365,13 @@ class PowerPCHardwareManager(hardware.HardwareManager):
                 if len(line.strip ()) == 0:
                     continue
 
-                try:
-                    # /0/5                   memory     8165MiB System memory
-                    # /0/1                 memory     255GiB System memory
-                    (_, _, memory, _, _) = line.split()
-                except ValueError:
-                    LOG.debug("%s: \'%s\' bad line", func, line)
-                    raise
+                # /0/5                   memory     8165MiB System memory
+                # /0/1                 memory     255GiB System memory
+                fields = line.split()
+                if len(fields) < 3:
+                    LOG.warning("%s: \'%s\' bad line", func, line)
+                    continue
+                memory = fields[-3]
 
                 if memory.endswith('GiB'):
                      physical_mb += int(memory[0:-3])*1024
@@ -253,12 +383,38 @@ class PowerPCHardwareManager(hardware.HardwareManager):
 
             LOG.debug("%s: physical_mb = %s", func, physical_mb)
 
-            return Memory(total=physical_mb, physical_mb=physical_mb)
+            if physical_mb:
+                return Memory(total=physical_mb, physical_mb=physical_mb)
         except (processutils.ProcessExecutionError, OSError) as e:
             LOG.warning("%s: Cannot execute %s: %s", func, cmd, e)
 
+        # Fall back to the memory ranges in the device tree
+        physical_mb = self.get_memory_layout().total_mb
+        if physical_mb:
+            LOG.debug("%s: device tree physical_mb = %s", func, physical_mb)
+            return Memory(total=physical_mb, physical_mb=physical_mb)
+
         return None
 
+    def get_memory_layout(self):
+        """Return the per DIMM and per NUMA node memory layout.
+
+        This only reads the device tree and sysfs, so it is cheap enough to
+        run on every inventory.
+
+        :return: a MemoryLayout
+        """
+        return memory_layout.collect_memory_layout(self.sys_path,
+                                                   self.device_tree_path)
+
+    def list_pci_devices(self):
+        """Return the PCI devices: GPUs, NVLink, CAPI adapters, NVMe, ...
+
+        :return: a list of PciDevice
+        """
+        return pci_devices.collect_pci_devices(self.sys_path)
+
+    @probe_cache.single_flight
     def get_bmc_address(self):
         # These modules are rarely loaded automatically
         utils.try_execute('modprobe', 'ipmi_msghandler')
@@ -276,6 +432,46 @@ class PowerPCHardwareManager(hardware.HardwareManager):
 
         return out.strip()
 
+    def _get_openbmc_client(self, address, username, password):
+        """Return a cached OpenBMC client, or None if it is not an OpenBMC.
+
+        Only definitive answers are cached: a BMC that refused the login is
+        not probed again, one that could not be reached or failed with a
+        5xx (for example while it reboots) is probed again on the next
+        call.
+        """
+        if not (address and username and password):
+            return None
+
+        key = (address, username)
+        with self._openbmc_lock:
+            if key in self._openbmc_clients:
+                return self._openbmc_clients[key]
+
+        # Probe without the lock, so many BMCs can be probed at once
+        from powerpc_hardware_manager import openbmc
+        try:
+            client = openbmc.probe(address, username, password)
+        except openbmc.OpenBMCError as e:
+            LOG.warning("Cannot reach the REST API of BMC %s, using "
+                        "ipmitool: %s", address, e)
+            return None
+
+        with self._openbmc_lock:
+            cached = self._openbmc_clients.setdefault(key, client)
+        if cached is not client and client is not None:
+            # Another thread probed the same BMC first
+            client.close()
+        return cached
+
+    def _release_openbmc_client(self, address, username):
+        """Close and forget the cached client of one BMC."""
+        with self._openbmc_lock:
+            client = self._openbmc_clients.pop((address, username), None)
+        if client is not None:
+            client.close()
+
+    @probe_cache.single_flight
     def get_system_vendor_info(self):
         func = "PowerPCHardwareManager.get_system_vendor_info"
         cmd = "lshw -quiet | egrep '^    (product|serial):'"
@@ -347,8 +543,257 @@ class PowerPCHardwareManager(hardware.HardwareManager):
                  # If it's safe for Ironic to abort cleaning while this step
                  # runs, this should be true.
                  "abortable": False
+               }, {
+                 # Same name and priority as the generic step, so that the
+                 # parallel erase replaces the serial one
+                 "step": "erase_devices",
+                 "priority": 10,
+                 "interface": "deploy",
+                 "reboot_requested": False,
+                 "abortable": True
+               }, {
+                 # Only run when requested through manual cleaning or a
+                 # priority override
+                 "step": "burnin_powerpc_node",
+                 "priority": 0,
+                 "interface": "deploy",
+                 "reboot_requested": False,
+                 "abortable": True
                }]
 
+    def erase_devices(self, node, ports):
+        """Erase all block devices in parallel.
+
+        This replaces the generic manager's erase_devices, which erases one
+        device after another.  Every device is erased with the fastest
+        method it supports: an NVMe format, a discard of the whole SSD, or
+        shred for rotational disks.  At most ERASE_CONTROLLER_CONCURRENCY
+        devices behind the same HBA or PCI parent are erased at once.
+        Like the generic erase, virtual media and read-only devices are
+        skipped, so the device the agent booted from is left alone.
+
+        :param node: Ironic node info.
+        :param ports: list of Ironic port objects
+        :raises BlockDeviceEraseError: when erasing any device fails
+        :returns: a dictionary of per device results, keyed by device name
+        """
+        func = "PowerPCHardwareManager.erase_devices"
+
+        block_devices = []
+        for block_device in self.list_block_devices():
+            if self._is_virtual_media_device(block_device):
+                LOG.info("%s: Skipping the erase of virtual media device "
+                         "%s", func, block_device.name)
+            elif self._is_read_only_device(block_device):
+                LOG.info("%s: Skipping the erase of read-only device %s",
+                         func, block_device.name)
+            else:
+                block_devices.append(block_device)
+        total = len(block_devices)
+        results = {}
+        lock = threading.Lock()
+        overall = threading.BoundedSemaphore(self.ERASE_MAX_CONCURRENCY)
+        controllers = {}
+        for block_device in block_devices:
+            controller = _get_device_controller(block_device.name,
+                                                self.sys_path)
+            if controller not in controllers:
+                controllers[controller] = threading.BoundedSemaphore(
+                    self.ERASE_CONTROLLER_CONCURRENCY)
+
+        def erase(block_device):
+            controller = _get_device_controller(block_device.name,
+                                                self.sys_path)
+            try:
+                with controllers[controller]:
+                    with overall:
+                        result = self._erase_block_device_fast(node,
+                                                               block_device)
+            except Exception as e:
+                LOG.exception(e)
+                result = {'method': None,
+                          'success': False,
+                          'seconds': 0,
+                          'size': block_device.size,
+                          'mb_per_second': None}
+            result['controller'] = controller
+            with lock:
+                results[block_device.name] = result
+                LOG.info("%s: %s erased with %s in %.1fs (%s MB/s), "
+                         "%d/%d devices done", func, block_device.name,
+                         result['method'], result['seconds'],
+                         result['mb_per_second'], len(results), total)
+
+        threads = [threading.Thread(target=erase, args=(block_device, ))
+                   for block_device in block_devices]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        failed = sorted(name for (name, result) in results.items()
+                        if not result['success'])
+        if failed:
+            raise errors.BlockDeviceEraseError(
+                'Failed to erase %s' % ', '.join(failed))
+
+        return results
+
+    def burnin_powerpc_node(self, node, ports):
+        """Benchmark memory and disks and fail cleaning on slow hardware.
+
+        Memory bandwidth is measured on every NUMA node with memory, disks
+        are read sequentially and at random, all at once.  The results are
+        compared against BURNIN_THRESHOLDS, updated with the node's
+        extra/burnin_thresholds.
+
+        The results are not persisted: they are the result of the clean
+        step command, the failures are in the CleaningError message, and
+        they are kept in memory for the 'burnin' section of the inventory,
+        which only appears when this agent process is inventoried again.
+
+        :param node: Ironic node info.
+        :param ports: list of Ironic port objects
+        :raises CleaningError: when a result is outside the tolerance
+        :returns: the results
+        """
+        from powerpc_hardware_manager import burnin
+
+        func = "PowerPCHardwareManager.burnin_powerpc_node"
+        extra = node.get('extra') or {}
+
+        thresholds = dict(self.BURNIN_THRESHOLDS)
+        for (key, value) in (extra.get('burnin_thresholds') or {}).items():
+            thresholds[key] = dict(thresholds.get(key, {}), **value)
+        tolerance = float(extra.get('burnin_tolerance',
+                                    burnin.DEFAULT_TOLERANCE))
+
+        layout = self.get_memory_layout()
+        nodes = [node_id for (node_id, total_mb)
+                 in zip(layout.node_id, layout.node_total_mb) if total_mb]
+        memory = burnin.run_memory_tests(nodes)
+        LOG.info("%s: memory bandwidth in MB/s per NUMA node: %s",
+                 func, memory)
+
+        disks = burnin.run_disk_tests(self.list_block_devices())
+        LOG.info("%s: disk results: %s", func, disks)
+
+        product_name = self.get_system_vendor_info().product_name
+        failures = burnin.evaluate(memory, disks, product_name, thresholds,
+                                   tolerance)
+
+        self._burnin_results = {'memory': memory,
+                                'disks': disks,
+                                'tolerance': tolerance,
+                                'failures': failures,
+                                'passed': not failures,
+                                'finished_at': time.time()}
+
+        if failures:
+            raise errors.CleaningError('Burn-in failed: %s'
+                                       % '; '.join(failures))
+
+        return self._burnin_results
+
+    def _is_virtual_media_device(self, block_device):
+        """Check if the block device is the virtual media the agent uses."""
+        vm_device_label = '/dev/disk/by-label/ir-vfd-dev'
+        if os.path.exists(vm_device_label):
+            link = os.readlink(vm_device_label)
+            device = os.path.normpath(os.path.join(os.path.dirname(
+                                                   vm_device_label), link))
+            if block_device.name == device:
+                return True
+        return False
+
+    def _is_read_only_device(self, block_device):
+        """Check the read-only flag of a block device."""
+        path = '{0}/block/{1}/ro'.format(self.sys_path,
+                                         os.path.basename(block_device.name))
+        try:
+            with open(path, 'r') as f:
+                return f.read().strip() == '1'
+        except IOError as e:
+            LOG.warning("Could not determine if %(dev)s is a read-only "
+                        "device: %(err)s",
+                        {'dev': block_device.name, 'err': e})
+            return False
+
+    def _erase_block_device_fast(self, node, block_device):
+        """Erase one block device with the fastest method it supports.
+
+        :param node: Ironic node info.
+        :param block_device: a BlockDevice object to be erased
+        :returns: a dictionary with the method used, success and timings
+        """
+        if os.path.basename(block_device.name).startswith('nvme'):
+            methods = [('nvme_format', self._nvme_format_block_device),
+                       ('blkdiscard', self._discard_block_device),
+                       ('shred', self._shred_block_device)]
+        elif not block_device.rotational:
+            methods = [('blkdiscard', self._discard_block_device),
+                       ('shred', self._shred_block_device)]
+        else:
+            methods = [('shred', self._shred_block_device)]
+
+        start = time.time()
+        method = None
+        success = False
+        for (method, erase) in methods:
+            if erase(node, block_device):
+                success = True
+                break
+
+        seconds = time.time() - start
+        mb_per_second = None
+        if success and seconds > 0:
+            mb_per_second = round(block_device.size / seconds / 2 ** 20, 1)
+
+        return {'method': method,
+                'success': success,
+                'seconds': round(seconds, 3),
+                'size': block_device.size,
+                'mb_per_second': mb_per_second}
+
+    def _nvme_format_block_device(self, node, block_device):
+        """Erase an NVMe namespace with a user data erase format."""
+        try:
+            utils.execute('nvme', 'format', block_device.name, '-s', '1')
+        except (processutils.ProcessExecutionError, OSError) as e:
+            LOG.warning("NVMe format of %(dev)s failed: %(err)s",
+                        {'dev': block_device.name, 'err': e})
+            return False
+        return True
+
+    def _discard_block_device(self, node, block_device):
+        """Erase a solid state device by discarding all of its blocks."""
+        try:
+            utils.execute('blkdiscard', block_device.name)
+        except (processutils.ProcessExecutionError, OSError) as e:
+            LOG.warning("Discarding %(dev)s failed: %(err)s",
+                        {'dev': block_device.name, 'err': e})
+            return False
+        return True
+
+    def _shred_block_device(self, node, block_device):
+        """Erase a block device by overwriting it with shred."""
+        info = node.get('driver_internal_info', {})
+        npasses = info.get('agent_erase_devices_iterations', 1)
+        args = ('shred', '--force')
+
+        if info.get('agent_erase_devices_zeroize', True):
+            args += ('--zero', )
+
+        args += ('--verbose', '--iterations', str(npasses), block_device.name)
+
+        try:
+            utils.execute(*args)
+        except (processutils.ProcessExecutionError, OSError) as e:
+            LOG.error("Erasing block device %(dev)s failed with error %(err)s",
+                      {'dev': block_device.name, 'err': e})
+            return False
+        return True
+
     def get_version(self):
         """Get a name and version for this hardware manager.
 
@@ -373,6 +818,8 @@ class PowerPCHardwareManager(hardware.HardwareManager):
         }
 
     def get_ipv4_addr(self, interface_id):
+        import netifaces
+
         try:
             addrs = netifaces.ifaddresses(interface_id)
             return addrs[netifaces.AF_INET][0]['addr']
@@ -442,12 +889,63 @@ class PowerPCHardwareManager(hardware.HardwareManager):
     def _is_latest_firmware_ipmi(self, node, ports):
         """Detect if device is running latest firmware."""
         func = "PowerPCHardwareManager._is_latest_firmware_ipmi"
+
+        version = self._get_firmware_version(node)
+
+        LOG.debug("%s: version = %s", func, version)
+
+        if version is None:
+            return False
+        # http://stackoverflow.com/a/29247821/5839258
+        elif version.upper().lower() == self.SYSTEM_FIRMWARE_VERSION.upper().lower():
+            return True
+        else:
+            return False
+
+    def _get_firmware_version(self, node):
+        """Read the System Firmware version of the node's BMC.
+
+        OpenBMC is asked through REST, everything else, and an OpenBMC
+        that gives no version, through ipmitool fru.
+
+        :returns: the version, or None when it cannot be read
+        """
+        func = "PowerPCHardwareManager._get_firmware_version"
         ipmi_username = node["driver_info"]["ipmi_username"]
         ipmi_address = node["driver_info"]["ipmi_address"]
         ipmi_password = node["driver_info"]["ipmi_password"]
 
         version = None
 
+        client = self._get_openbmc_client(ipmi_address,
+                                          ipmi_username,
+                                          ipmi_password)
+        if client is not None:
+            from powerpc_hardware_manager import openbmc
+            try:
+                version = client.get_firmware_version()
+            except openbmc.OpenBMCError as e:
+                LOG.warning("%s: Cannot read OpenBMC firmware version: %s",
+                            func, e)
+            if version is None:
+                LOG.debug("%s: No version from OpenBMC REST, trying "
+                          "ipmitool", func)
+
+        if version is None:
+            version = self._get_firmware_version_ipmi(ipmi_address,
+                                                      ipmi_username,
+                                                      ipmi_password)
+
+        return version
+
+    @probe_cache.single_flight
+    def _get_firmware_version_ipmi(self, ipmi_address, ipmi_username,
+                                   ipmi_password):
+        """Read the System Firmware version out of ipmitool fru."""
+        func = "PowerPCHardwareManager._get_firmware_version_ipmi"
+
+        version = None
+
         try:
             cmd = ("sudo ipmitool "
                    "-I lanplus "
@@ -482,15 +980,7 @@ class PowerPCHardwareManager(hardware.HardwareManager):
         except (processutils.ProcessExecutionError, OSError) as e:
             LOG.warning("%s: Cannot execute %s: %s", func, cmd, e)
 
-        LOG.debug("%s: version = %s", func, version)
-
-        if version is None:
-            return False
-        # http://stackoverflow.com/a/29247821/5839258
-        elif version.upper().lower() == self.SYSTEM_FIRMWARE_VERSION.upper().lower():
-            return True
-        else:
-            return False
+        return version
 
     def _upgrade_firmware_ipmi(self, node, ports):
         """Upgrade firmware on device."""
@@ -514,6 +1004,9 @@ class PowerPCHardwareManager(hardware.HardwareManager):
 
             out, _ = utils.execute(cmd, shell=True)
 
+            # The next check must read the new version from the BMC
+            probe_cache.invalidate('_get_firmware_version_ipmi')
+
             return True
 
         except (processutils.ProcessExecutionError, OSError) as e:
@@ -525,5 +1018,4 @@ class PowerPCHardwareManager(hardware.HardwareManager):
         # Ironic powers off the computer before the entire debug log has
         # been flushed out. Hack that here. :(
         LOG.debug("MARKMARK")
-        import time
         time.sleep (30)
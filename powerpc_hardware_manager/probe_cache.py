@@ -0,0 +1,157 @@
+# Copyright 2016 International Business Machines
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+#
+# Process wide de-duplication of slow, idempotent hardware probes.
+#
+# IPA calls into the hardware managers from several places at nearly the
+# same time (lookup, inspection, clean step checks), and every call of
+# get_cpus, list_block_devices, ... used to fork its own lscpu, lsblk,
+# lshw or ipmitool.  Methods decorated with single_flight instead share:
+#
+#   - one in-flight execution: callers arriving while a probe with the
+#     same arguments runs wait for it and get its parsed result, or its
+#     exception
+#   - its result for the ttl given by the manager's PROBE_CACHE_TTL;
+#     errors are never cached
+#
+# Results are shared objects, callers must not modify them.  Hits,
+# misses, shared calls and errors are counted per probe, see stats().
+#
+
+import functools
+import threading
+import time
+
+COUNTERS = ('hits', 'misses', 'shared', 'errors')
+
+
+class _Flight(object):
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class ProbeCache(object):
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # key -> (expires, result)
+        self._results = {}
+        # key -> _Flight
+        self._flights = {}
+        # probe name -> {counter: value}
+        self._stats = {}
+
+    def _count(self, name, counter):
+        counters = self._stats.get(name)
+        if counters is None:
+            counters = self._stats[name] = dict.fromkeys(COUNTERS, 0)
+        counters[counter] += 1
+
+    def call(self, key, func, ttl):
+        """Return func(), shared with concurrent and recent callers of key.
+
+        :param key: a hashable tuple, starting with the probe name
+        :param func: the probe, called without arguments
+        :param ttl: seconds the result is reused, 0 to only share the
+            in-flight execution
+        """
+        with self._lock:
+            now = time.time()
+            cached = self._results.get(key)
+            if cached is not None and cached[0] > now:
+                self._count(key[0], 'hits')
+                return cached[1]
+
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                self._count(key[0], 'misses')
+                flight = self._flights[key] = _Flight()
+            else:
+                self._count(key[0], 'shared')
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = func()
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+                if flight.error is not None:
+                    self._count(key[0], 'errors')
+                elif ttl > 0:
+                    now = time.time()
+                    for (old_key, (expires, _)) in list(
+                            self._results.items()):
+                        if expires <= now:
+                            del self._results[old_key]
+                    self._results[key] = (now + ttl, flight.result)
+            flight.done.set()
+
+        return flight.result
+
+    def invalidate(self, name=None):
+        """Forget cached results of one probe, or of all probes."""
+        with self._lock:
+            for key in list(self._results):
+                if name is None or key[0] == name:
+                    del self._results[key]
+
+    def stats(self):
+        with self._lock:
+            return dict((name, dict(counters))
+                        for (name, counters) in self._stats.items())
+
+
+_cache = ProbeCache()
+
+
+def single_flight(method):
+    """Share the results of a manager method through the process cache.
+
+    The method's positional arguments are part of the key, the manager
+    instance is not.  The ttl is the manager's PROBE_CACHE_TTL.
+    """
+    name = method.__name__
+
+    @functools.wraps(method)
+    def wrapper(self, *args):
+        return _cache.call((name, ) + args,
+                           lambda: method(self, *args),
+                           self.PROBE_CACHE_TTL)
+
+    return wrapper
+
+
+def invalidate(name=None):
+    _cache.invalidate(name)
+
+
+def stats():
+    """Return {probe name: {'hits': .., 'misses': .., 'shared': ..,
+    'errors': ..}} for this process.
+    """
+    return _cache.stats()
@@ -0,0 +1,173 @@
+# Copyright 2016 International Business Machines
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+#
+# Bounded storage for BMC sensor readings.
+#
+# Every sensor of every host gets a RingBuffer of a fixed capacity, backed
+# by two arrays: timestamps as doubles and values as floats, 12 bytes per
+# sample.  Once full, the oldest sample is overwritten, so memory stays at
+# hosts * sensors * capacity * 12 bytes however long sampling runs.
+# Minimum, maximum and sum are kept up to date on every append, so
+# summaries never walk the buffer.
+#
+
+import array
+import csv
+import threading
+
+# Per sample storage, see the header
+TIMESTAMP_TYPECODE = 'd'
+VALUE_TYPECODE = 'f'
+
+SUMMARY_DIGITS = 3
+SUMMARY_FIELDS = ('host', 'sensor', 'units', 'samples', 'first', 'last',
+                  'min', 'max', 'mean', 'latest')
+
+
+class RingBuffer(object):
+    """The last capacity (timestamp, value) samples of one sensor."""
+
+    __slots__ = ('capacity', 'timestamps', 'values', 'head', 'count',
+                 'total', 'minimum', 'maximum')
+
+    def __init__(self, capacity):
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.capacity = capacity
+        self.timestamps = array.array(TIMESTAMP_TYPECODE, [0.0] * capacity)
+        self.values = array.array(VALUE_TYPECODE, [0.0] * capacity)
+        # Index the next sample is written to
+        self.head = 0
+        self.count = 0
+        # Over the samples in the buffer
+        self.total = 0.0
+        self.minimum = None
+        self.maximum = None
+
+    def __len__(self):
+        return self.count
+
+    def append(self, timestamp, value):
+        dropped = None
+        if self.count == self.capacity:
+            dropped = self.values[self.head]
+            self.total -= dropped
+        else:
+            self.count += 1
+
+        self.timestamps[self.head] = timestamp
+        self.values[self.head] = value
+        # Store first, so the running values use the stored precision
+        value = self.values[self.head]
+        self.total += value
+        self.head = (self.head + 1) % self.capacity
+
+        if dropped is not None and dropped in (self.minimum, self.maximum):
+            # The extreme may have left the window
+            self.minimum = min(self.values)
+            self.maximum = max(self.values)
+        else:
+            if self.minimum is None or value < self.minimum:
+                self.minimum = value
+            if self.maximum is None or value > self.maximum:
+                self.maximum = value
+
+    def samples(self):
+        """Yield the (timestamp, value) samples, oldest first."""
+        start = (self.head - self.count) % self.capacity
+        for idx in range(self.count):
+            pos = (start + idx) % self.capacity
+            yield (self.timestamps[pos], self.values[pos])
+
+    def latest(self):
+        if not self.count:
+            return None
+        pos = (self.head - 1) % self.capacity
+        return (self.timestamps[pos], self.values[pos])
+
+    def summary(self):
+        """Return a dictionary with min, max, mean, ... of the buffer."""
+        if not self.count:
+            return {'samples': 0}
+        start = (self.head - self.count) % self.capacity
+        # Values are stored as floats, round away their noise
+        return {'samples': self.count,
+                'first': self.timestamps[start],
+                'last': self.latest()[0],
+                'min': round(self.minimum, SUMMARY_DIGITS),
+                'max': round(self.maximum, SUMMARY_DIGITS),
+                'mean': round(self.total / self.count, SUMMARY_DIGITS),
+                'latest': round(self.latest()[1], SUMMARY_DIGITS)}
+
+
+class SensorLog(object):
+    """Ring buffers of every sensor of many hosts.
+
+    Every host is recorded from one thread, but summaries and exports can
+    run from another, so all access goes through one lock.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.buffers = {}
+        self.units = {}
+        self.lock = threading.Lock()
+
+    def record(self, host, timestamp, sensors):
+        """Append one reading of sensors, a list of openbmc.Sensor."""
+        with self.lock:
+            for sensor in sensors:
+                key = (host, sensor.path)
+                buf = self.buffers.get(key)
+                if buf is None:
+                    buf = self.buffers[key] = RingBuffer(self.capacity)
+                    self.units[key] = sensor.units
+                buf.append(timestamp, sensor.value)
+
+    def nbytes(self):
+        """Bytes held by the sample arrays."""
+        with self.lock:
+            return sum(buf.timestamps.itemsize * buf.capacity +
+                       buf.values.itemsize * buf.capacity
+                       for buf in self.buffers.values())
+
+    def summaries(self):
+        """Return a summary dictionary per (host, sensor), sorted."""
+        with self.lock:
+            result = []
+            for key in sorted(self.buffers):
+                summary = self.buffers[key].summary()
+                summary.update({'host': key[0],
+                                'sensor': key[1],
+                                'units': self.units[key]})
+                result.append(summary)
+            return result
+
+    def write_csv(self, fp):
+        """Write every stored sample as host,sensor,units,timestamp,value."""
+        writer = csv.writer(fp)
+        writer.writerow(['host', 'sensor', 'units', 'timestamp', 'value'])
+        with self.lock:
+            for key in sorted(self.buffers):
+                for (timestamp, value) in self.buffers[key].samples():
+                    writer.writerow([key[0], key[1], self.units[key],
+                                     '%.3f' % timestamp, '%g' % value])
+
+    def write_summary_csv(self, fp):
+        writer = csv.writer(fp)
+        writer.writerow(SUMMARY_FIELDS)
+        for summary in self.summaries():
+            writer.writerow([summary.get(field, '')
+                             for field in SUMMARY_FIELDS])
@@ -0,0 +1,77 @@
+# Copyright 2016 International Business Machines
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+#
+# Readers for sysfs attributes and /proc/device-tree properties, shared by
+# cpu_topology, memory_layout and pci_devices.
+#
+# A missing or unreadable file is not an error on these trees (offline
+# CPUs, devices without a driver, firmware without a property), so every
+# reader returns None instead of raising.
+#
+
+import struct
+
+
+def read_file(path):
+    """Return the raw contents of a file, or None."""
+    try:
+        with open(path, 'rb') as f:
+            return f.read()
+    except (IOError, OSError):
+        return None
+
+
+def read_string(path):
+    """Return a text attribute without surrounding whitespace, or None."""
+    value = read_file(path)
+    if value is None:
+        return None
+    return value.decode('utf-8', 'replace').strip()
+
+
+def read_int(path, base=10):
+    """Return an integer attribute, or None if missing or malformed."""
+    value = read_file(path)
+    try:
+        return int(value.strip(), base)
+    except (AttributeError, ValueError):
+        return None
+
+
+def string_property(value):
+    """Decode a NUL terminated device tree string property."""
+    if value is None:
+        return None
+    return value.split(b'\0', 1)[0].decode('ascii', 'replace').strip()
+
+
+def cells(value):
+    """Decode a device tree property of big endian 32 bit cells."""
+    if not value:
+        return []
+    count = len(value) // 4
+    return list(struct.unpack('>%dI' % count, value[:count * 4]))
+
+
+def int_property(value):
+    """Decode a property stored either as one cell or as a string."""
+    if value is None:
+        return None
+    if len(value) == 4 and not value.rstrip(b'\0').isdigit():
+        return cells(value)[0]
+    try:
+        return int(string_property(value))
+    except (TypeError, ValueError):
+        return None
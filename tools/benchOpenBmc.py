@@ -0,0 +1,228 @@
+#!/usr/bin/python
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+#
+# Load benchmark for the openBmcTool.py REST calls.
+#
+# By default it starts --hosts mock BMCs (see mockOpenBmc.py) and runs
+# every operation --iterations times per host, both the way the tool is
+# used from shell scripts today (new session and login per call) and over
+# one shared keep-alive session per host.  Pass --target to point it at
+# real BMCs instead.
+#
+# Example:
+#
+#   ./benchOpenBmc.py --hosts 1 --iterations 200 --latency 5
+#   ./benchOpenBmc.py --hosts 32 --concurrency 32 --iterations 20
+#
+
+from __future__ import print_function
+
+import argparse
+import imp
+import json
+import os
+import sys
+import threading
+import time
+
+import mockOpenBmc
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+openBmcTool = imp.load_source("openBmcTool",
+                              os.path.join(TOOLS_DIR, "openBmcTool.py"))
+
+class Args(object):
+    # Stands in for the argparse namespace the tool functions expect
+    def __init__(self, hostname, user, password, command=None):
+        self.hostname = hostname
+        self.user = user
+        self.password = password
+        self.command = command
+        self.verbose = False
+        self.timeout = 30
+
+class NullWriter(object):
+    # The tool functions print progress, which would swamp the results
+    def write(self, data):
+        pass
+
+    def flush(self):
+        pass
+
+def _op_login(session, args):
+    return openBmcTool._login(session, args)
+
+def _op_enumerate_control(session, args):
+    return openBmcTool._enumerate_org_openbmc_control(session,
+                                                      args) is not None
+
+def _op_set_power(session, args):
+    args.command = "on"
+    return openBmcTool.set_power(session, None, args)
+
+def _op_show_memory(session, args):
+    return openBmcTool.show_memory(session, None, args)
+
+def _op_get_boot_progress(session, args):
+    return openBmcTool.get_boot_progress(session, None, args)
+
+OPERATIONS = [("login", _op_login),
+              ("enumerate_control", _op_enumerate_control),
+              ("set_power", _op_set_power),
+              ("show_memory", _op_show_memory),
+              ("get_boot_progress", _op_get_boot_progress)]
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    idx = int(round(fraction * (len(sorted_values) - 1)))
+    return sorted_values[idx]
+
+def run_host(hostname, bench_args, operation, mode, latencies, errors):
+    args = Args(hostname, bench_args.user, bench_args.password)
+    session = None
+
+    for _ in range(bench_args.iterations):
+        start = time.time()
+        try:
+            if mode == "fresh" or session is None:
+                if session is not None:
+                    session.close()
+                    session = None
+                new_session = openBmcTool._new_session(args)
+                if not openBmcTool._login(new_session, args):
+                    new_session.close()
+                    raise Exception("login failed")
+                session = new_session
+            ok = operation(session, args)
+        except Exception:
+            ok = False
+        latencies.append(time.time() - start)
+        if not ok:
+            errors.append(hostname)
+
+    if session is not None:
+        session.close()
+
+def run(hostnames, bench_args, name, operation, mode):
+    latencies = []
+    errors = []
+    semaphore = threading.Semaphore(bench_args.concurrency)
+
+    def worker(hostname):
+        with semaphore:
+            run_host(hostname, bench_args, operation, mode, latencies,
+                     errors)
+
+    threads = [threading.Thread(target=worker, args=(hostname, ))
+               for hostname in hostnames]
+
+    start = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.time() - start
+
+    latencies.sort()
+    return {"operation": name,
+            "mode": mode,
+            "hosts": len(hostnames),
+            "calls": len(latencies),
+            "errors": len(errors),
+            "seconds": round(elapsed, 3),
+            "calls_per_second": round(len(latencies) / elapsed, 1),
+            "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+            "p99_ms": round(percentile(latencies, 0.99) * 1000, 2)}
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Benchmark openBmcTool.")
+    parser.add_argument("--target",
+                        action="append",
+                        default=[],
+                        help="real BMC to use instead of mocks, repeatable")
+    parser.add_argument("-u",
+                        "--user",
+                        action="store",
+                        default="root",
+                        help="user")
+    parser.add_argument("-p",
+                        "--password",
+                        action="store",
+                        default="0penBmc",
+                        help="password")
+    parser.add_argument("--hosts",
+                        action="store",
+                        type=int,
+                        default=1,
+                        help="number of mock BMCs to start")
+    parser.add_argument("--concurrency",
+                        action="store",
+                        type=int,
+                        default=None,
+                        help="hosts driven at once, defaults to all")
+    parser.add_argument("--iterations",
+                        action="store",
+                        type=int,
+                        default=50,
+                        help="calls per host and operation")
+    parser.add_argument("--operation",
+                        action="append",
+                        choices=[name for (name, _) in OPERATIONS],
+                        help="only run these operations, repeatable")
+    parser.add_argument("--mode",
+                        action="append",
+                        choices=["fresh", "shared"],
+                        help="session handling to measure, repeatable")
+    mockOpenBmc.add_state_arguments(parser)
+
+    args = parser.parse_args()
+
+    mocks = []
+    if args.target:
+        hostnames = args.target
+    else:
+        for _ in range(args.hosts):
+            mocks.append(mockOpenBmc.MockOpenBmc(
+                user=args.user,
+                password=args.password,
+                **mockOpenBmc.state_kwargs(args)).start())
+        hostnames = [mock.hostname for mock in mocks]
+
+    if args.concurrency is None:
+        args.concurrency = len(hostnames)
+
+    operations = [(name, func) for (name, func) in OPERATIONS
+                  if not args.operation or name in args.operation]
+    modes = args.mode or ["fresh", "shared"]
+
+    # Silence the tool while it runs, results go to the real stdout
+    stdout = sys.stdout
+    try:
+        for (name, func) in operations:
+            for mode in modes:
+                sys.stdout = sys.stderr = NullWriter()
+                try:
+                    result = run(hostnames, args, name, func, mode)
+                finally:
+                    sys.stdout = stdout
+                    sys.stderr = sys.__stderr__
+                print(json.dumps(result, sort_keys=True))
+                sys.stdout.flush()
+    finally:
+        for mock in mocks:
+            mock.stop()
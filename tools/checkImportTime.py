@@ -0,0 +1,145 @@
+#!/usr/bin/python
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+#
+# Import time budget for the hardware manager.
+#
+# IPA imports every hardware manager when it starts.  This imports
+# powerpc_hardware_manager.powerpc_device in fresh interpreters, after the
+# modules IPA has loaded by then anyway (--baseline), and fails when the
+# median import time is over --budget milliseconds or when a module that
+# is meant to be loaded lazily (--forbid) was imported.
+#
+# Example:
+#
+#   ./checkImportTime.py --budget 50 --runs 7
+#
+
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+CHILD = """
+import json, sys, time
+for name in %(baseline)r:
+    __import__(name)
+before = set(sys.modules)
+start = time.time()
+__import__(%(module)r)
+seconds = time.time() - start
+print(json.dumps({"ms": seconds * 1000,
+                  "modules": sorted(set(sys.modules) - before)}))
+"""
+
+def measure(python, module, baseline):
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        [ROOT] + [path for path in [env.get("PYTHONPATH")] if path])
+    out = subprocess.check_output([python,
+                                   "-c",
+                                   CHILD % {"module": module,
+                                            "baseline": baseline}],
+                                  env=env)
+    return json.loads(out.decode("utf-8").strip().splitlines()[-1])
+
+def median(values):
+    values = sorted(values)
+    middle = len(values) // 2
+    if len(values) % 2:
+        return values[middle]
+    return (values[middle - 1] + values[middle]) / 2.0
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Check the import time.")
+    parser.add_argument("--module",
+                        action="store",
+                        dest="module",
+                        default="powerpc_hardware_manager.powerpc_device",
+                        help="Module to import")
+    parser.add_argument("--baseline",
+                        action="store",
+                        dest="baseline",
+                        default="ironic_python_agent.hardware",
+                        help="Comma separated modules imported first")
+    parser.add_argument("--forbid",
+                        action="store",
+                        dest="forbid",
+                        default="powerpc_hardware_manager.burnin,"
+                                "powerpc_hardware_manager.disk_health,"
+                                "powerpc_hardware_manager.openbmc",
+                        help="Comma separated modules that must not be "
+                             "imported")
+    parser.add_argument("--budget",
+                        action="store",
+                        dest="budget",
+                        type=float,
+                        default=50.0,
+                        help="Median import time allowed, in ms")
+    parser.add_argument("--runs",
+                        action="store",
+                        dest="runs",
+                        type=int,
+                        default=5,
+                        help="Fresh interpreters to measure")
+    parser.add_argument("--python",
+                        action="store",
+                        dest="python",
+                        default=sys.executable,
+                        help="Interpreter to measure")
+    parser.add_argument("-v",
+                        "--verbose",
+                        action="store_true",
+                        dest="verbose",
+                        help="List the modules the import loaded")
+
+    args = parser.parse_args()
+
+    baseline = [name for name in args.baseline.split(",") if name]
+    forbid = [name for name in args.forbid.split(",") if name]
+
+    try:
+        results = [measure(args.python, args.module, baseline)
+                   for _ in range(args.runs)]
+    except subprocess.CalledProcessError as e:
+        print("Importing %s failed: %s" % (args.module, e), file=sys.stderr)
+        sys.exit(2)
+
+    ms = median([result["ms"] for result in results])
+    modules = results[-1]["modules"]
+    loaded = [name for name in forbid if name in modules]
+
+    print("%s: %.1f ms median over %d runs (budget %.1f ms), %d modules "
+          "loaded" % (args.module, ms, len(results), args.budget,
+                      len(modules)))
+    if args.verbose:
+        for name in modules:
+            print("  %s" % name)
+
+    failed = False
+    if ms > args.budget:
+        print("Over budget by %.1f ms" % (ms - args.budget), file=sys.stderr)
+        failed = True
+    for name in loaded:
+        print("%s should be imported lazily" % name, file=sys.stderr)
+        failed = True
+
+    sys.exit(1 if failed else 0)
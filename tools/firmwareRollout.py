@@ -0,0 +1,267 @@
+#!/usr/bin/python
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+#
+# Fleet firmware rollout, using the same version check and hpm upgrade
+# as the upgrade_powerpc_firmware clean step.
+#
+# Hosts are checked and flashed --concurrency at a time, with at most
+# --segment-uploads images being pushed into any one management network
+# segment at once.  Every finished host is appended to the journal, and
+# hosts the journal already records as current or flashed are skipped
+# without contacting their BMC, so an interrupted rollout is resumed by
+# running the same command again.
+#
+# A host whose version cannot be read (BMC unreachable, session limit,
+# no version in the FRU data) is reported as check_failed and is not
+# flashed.  Like failed hosts, it is tried again by the next run.
+#
+# The host file has one BMC per line, optionally followed by its
+# management network segment:
+#
+#   # bmc address     segment
+#   10.0.1.11         mgmt-1
+#   10.0.1.12         mgmt-1
+#   10.0.2.11         mgmt-2
+#
+# Example:
+#
+#   ./firmwareRollout.py -u ADMIN -p admin --journal rollout.journal \
+#       --image /root/8348_810.1603.20160310b_update.hpm \
+#       --version IBM-habanero-ibm-OP8_v1.7_1.62 hosts.txt
+#
+
+from __future__ import print_function
+
+import argparse
+import collections
+import json
+import os
+import sys
+import threading
+import time
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                ".."))
+
+from powerpc_hardware_manager import powerpc_device
+
+import hostFile
+
+Host = collections.namedtuple('Host', ['address', 'segment'])
+
+# Journal states that mean the host needs nothing more
+DONE_STATES = ("current", "flashed")
+
+class Journal(object):
+    # Append only JSON lines, the last entry for a host wins
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.states = {}
+
+        if os.path.exists(path):
+            with open(path) as fp:
+                for line in fp:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # A torn last line from an interrupted run
+                        continue
+                    self.states[entry["host"]] = entry
+
+        self.fp = open(path, "a")
+
+    def done(self, address, version):
+        entry = self.states.get(address)
+        return (entry is not None and
+                entry.get("state") in DONE_STATES and
+                entry.get("version") == version)
+
+    def record(self, entry):
+        with self.lock:
+            self.states[entry["host"]] = entry
+            self.fp.write(json.dumps(entry, sort_keys=True) + "\n")
+            self.fp.flush()
+            os.fsync(self.fp.fileno())
+
+    def close(self):
+        self.fp.close()
+
+def make_node(host, args):
+    # The clean step reads the BMC credentials out of the Ironic node
+    return {"driver_info": {"ipmi_address": host.address,
+                            "ipmi_username": args.user,
+                            "ipmi_password": args.password}}
+
+def rollout_host(manager, host, args, uploads):
+    node = make_node(host, args)
+    entry = {"host": host.address,
+             "segment": host.segment,
+             "version": args.version}
+    start = time.time()
+
+    try:
+        # Read the version here instead of asking _is_latest_firmware_ipmi,
+        # which cannot tell an unreadable version from an outdated one
+        found = manager._get_firmware_version(node)
+        entry["found"] = found
+        if found is None:
+            # Never flash a host blind, it may well be current already
+            entry["state"] = "check_failed"
+        elif found.lower() == args.version.lower():
+            entry["state"] = "current"
+        elif args.dry_run:
+            entry["state"] = "outdated"
+        else:
+            checked = time.time()
+            with uploads[host.segment]:
+                entry["wait_s"] = round(time.time() - checked, 3)
+                if manager._upgrade_firmware_ipmi(node, None):
+                    entry["state"] = "flashed"
+                else:
+                    entry["state"] = "failed"
+    finally:
+        # The manager caches a logged in REST session per BMC, which would
+        # otherwise hold a connection to every host until the rollout ends
+        manager._release_openbmc_client(host.address, args.user)
+
+    entry["seconds"] = round(time.time() - start, 3)
+    entry["time"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+    return entry
+
+def rollout(hosts, args, journal, report):
+    manager = powerpc_device.PowerPCHardwareManager()
+    # Instance attributes shadow the clean step's class defaults
+    manager.SYSTEM_FIRMWARE_VERSION = args.version
+    manager.SYSTEM_FIRMWARE_FILE = args.image
+
+    uploads = collections.defaultdict(
+        lambda: threading.BoundedSemaphore(args.segment_uploads))
+    # Create them up front, defaultdict is not thread safe
+    for host in hosts:
+        uploads[host.segment]
+
+    work = queue.Queue()
+    for host in hosts:
+        if journal.done(host.address, args.version):
+            report({"host": host.address, "state": "skipped"})
+            continue
+        work.put(host)
+
+    def worker():
+        while True:
+            try:
+                host = work.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                entry = rollout_host(manager, host, args, uploads)
+            except Exception as e:
+                entry = {"host": host.address,
+                         "segment": host.segment,
+                         "version": args.version,
+                         "state": "failed",
+                         "error": str(e)}
+            # A dry run must not mark anything as done
+            if not args.dry_run:
+                journal.record(entry)
+            report(entry)
+
+    threads = [threading.Thread(target=worker)
+               for _ in range(min(args.concurrency, work.qsize()))]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+    for thread in threads:
+        # join() with a timeout keeps ^C working on python 2
+        while thread.is_alive():
+            thread.join(1.0)
+
+if __name__ == "__main__":
+
+    manager_class = powerpc_device.PowerPCHardwareManager
+
+    parser = argparse.ArgumentParser(description="Roll out firmware.")
+    parser.add_argument("-u",
+                        "--user",
+                        action="store",
+                        required=True,
+                        help="BMC user")
+    parser.add_argument("-p",
+                        "--password",
+                        action="store",
+                        required=True,
+                        help="BMC password")
+    parser.add_argument("--image",
+                        action="store",
+                        default=manager_class.SYSTEM_FIRMWARE_FILE,
+                        help="hpm image to flash")
+    parser.add_argument("--version",
+                        action="store",
+                        default=manager_class.SYSTEM_FIRMWARE_VERSION,
+                        help="System Firmware version the image contains")
+    parser.add_argument("--journal",
+                        action="store",
+                        required=True,
+                        help="progress journal, reused to resume")
+    parser.add_argument("--concurrency",
+                        action="store",
+                        type=int,
+                        default=16,
+                        help="hosts checked or flashed at once")
+    parser.add_argument("--segment-uploads",
+                        action="store",
+                        type=int,
+                        default=2,
+                        dest="segment_uploads",
+                        help="concurrent flashes per network segment")
+    parser.add_argument("--dry-run",
+                        action="store_true",
+                        dest="dry_run",
+                        help="only report which hosts are outdated")
+    parser.add_argument("hosts",
+                        action="store",
+                        help="host file, - for stdin")
+
+    args = parser.parse_args()
+
+    hosts = [Host(address, segment or "default")
+             for (address, segment) in hostFile.read_hosts(args.hosts, 2)]
+
+    report_lock = threading.Lock()
+
+    def report(entry):
+        with report_lock:
+            print(json.dumps(entry, sort_keys=True))
+            sys.stdout.flush()
+
+    journal = Journal(args.journal)
+    try:
+        rollout(hosts, args, journal, report)
+    finally:
+        journal.close()
+
+    failed = [host for host in hosts
+              if journal.states.get(host.address, {}).get("state") in
+              ("failed", "check_failed")]
+    if failed:
+        sys.exit(2)
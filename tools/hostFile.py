@@ -0,0 +1,42 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+#
+# The host file format shared by powerSequencer.py, firmwareRollout.py and
+# sensorSampler.py: one host per line, optionally followed by more
+# whitespace separated columns, with # starting a comment.
+#
+#   # hostname        rack    pdu
+#   bmc-r1-01         r1      pdu-a
+#   bmc-r1-02
+#
+
+import sys
+
+def parse_hosts(fp, columns=1):
+    # Every line as a list of exactly columns fields, None where missing
+    hosts = []
+    for line in fp:
+        fields = line.split("#", 1)[0].split()
+        if not fields:
+            continue
+        fields += [None] * (columns - len(fields))
+        hosts.append(fields[:columns])
+    return hosts
+
+def read_hosts(name, columns=1):
+    # name is a path, or - for stdin
+    if name == "-":
+        return parse_hosts(sys.stdin, columns)
+    with open(name) as fp:
+        return parse_hosts(fp, columns)
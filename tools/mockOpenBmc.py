@@ -0,0 +1,452 @@
+#!/usr/bin/python
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+#
+# A local stand-in for the OpenBMC REST server, so that openBmcTool.py and
+# powerpc_hardware_manager.openbmc can be exercised and benchmarked without
+# real hardware.  It answers the subset of the REST API those use:
+#
+#   POST /login
+#   GET  /org/openbmc/
+#   GET  /org/openbmc/control/enumerate
+#   POST /org/openbmc/control/chassis0/action/{powerOn,powerOff}
+#   GET  /org/openbmc/inventory/system/enumerate
+#   GET  /org/openbmc/inventory/system/bios
+#   GET  /org/openbmc/sensors/enumerate
+#   GET  /org/openbmc/sensors/host/BootProgress
+#   POST /org/openbmc/sensors/host/BootProgress/action/getValue
+#   POST /org/openbmc/NetworkManager/Interface/action/GetAddress4
+#
+# Example:
+#
+#   ./mockOpenBmc.py --port 8443 --latency 20 --failure-rate 0.01 &
+#   ./openBmcTool.py -n localhost:8443 -u root -p 0penBmc set_power on
+#
+
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import random
+import shutil
+import ssl
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+try:
+    from BaseHTTPServer import BaseHTTPRequestHandler
+    from BaseHTTPServer import HTTPServer
+    from SocketServer import ThreadingMixIn
+except ImportError:
+    from http.server import BaseHTTPRequestHandler
+    from http.server import HTTPServer
+    from socketserver import ThreadingMixIn
+
+COOKIE = "sid=mockopenbmc"
+FIRMWARE_VERSION = "IBM-habanero-ibm-OP8_v1.7_1.62"
+
+class BmcState(object):
+    # Everything one emulated BMC knows, shared by all handler threads
+
+    def __init__(self, user="root", password="0penBmc", dimms=16,
+                 padding=0, latency=0.0, jitter=0.0, failure_rate=0.0,
+                 power_delay=0.0, seed=None):
+        self.user = user
+        self.password = password
+        self.dimms = dimms
+        self.padding = padding
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.power_delay = power_delay
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.power_state = 0
+        self.power_changed = 0.0
+        self.requests = 0
+        self.failures = 0
+
+    def get_power_state(self):
+        # Power transitions only become visible after power_delay seconds,
+        # like a real chassis waiting for pgood
+        with self.lock:
+            if time.time() - self.power_changed < self.power_delay:
+                return 1 - self.power_state
+            return self.power_state
+
+    def set_power_state(self, state):
+        with self.lock:
+            if state != self.power_state:
+                self.power_state = state
+                self.power_changed = time.time()
+
+    def boot_progress(self):
+        if self.get_power_state() == 0:
+            return "Off"
+        return "FW Progress, Starting OS"
+
+    def control(self):
+        state = self.get_power_state()
+        return {
+            "/org/openbmc/control/power0": {"pgood": state,
+                                            "poll_interval": 3000,
+                                            "pgood_timeout": 10,
+                                            "heatbeat": 0,
+                                            "state": state},
+            "/org/openbmc/control/chassis0": {"reboot": 0,
+                                              "uuid": "24340d83aa784d85"
+                                                      "8468993286b390a5"},
+        }
+
+    def inventory(self):
+        data = {}
+        prefix = "/org/openbmc/inventory/system/chassis/motherboard"
+        for idx in range(self.dimms):
+            path = "%s/dimm%d" % (prefix, idx, )
+            data[path] = {"Version": "0x0000",
+                          "Name": "0x0b",
+                          "Asset Tag": "",
+                          "is_fru": 1,
+                          "fru_type": "DIMM",
+                          "Serial Number": "0x%08x" % (0x02bb58a7 + idx, ),
+                          "Model Number": "M393B2G70DB0-YK0  ",
+                          "version": "",
+                          "fault": "False",
+                          "present": "True",
+                          "Manufacturer": "0xce80",
+                          # Inflates the payload for large-inventory runs
+                          "Custom Field 1": "x" * self.padding}
+            data[path + "/event"] = {}
+        data["/org/openbmc/inventory/system/bios"] = self.bios()
+        return data
+
+    def sensors(self):
+        # Readings wander a little around a base value that rises with the
+        # power state, like a machine under load
+        on = self.get_power_state()
+        prefix = "/org/openbmc/sensors"
+        data = {prefix + "/host/BootProgress": {"units": "",
+                                                 "value": self.boot_progress(),
+                                                 "error": 0}}
+        with self.lock:
+            readings = [("temperature/ambient", "C", 24),
+                        ("temperature/cpu0/core0", "C", 35 + 30 * on),
+                        ("temperature/cpu1/core0", "C", 35 + 30 * on),
+                        ("speed/fan0", "rpm", 4000 + 4000 * on),
+                        ("speed/fan1", "rpm", 4000 + 4000 * on),
+                        ("power/system", "W", 40 + 900 * on)]
+            for (name, units, base) in readings:
+                value = int(base * self.random.uniform(0.95, 1.05))
+                data["%s/%s" % (prefix, name)] = {"units": units,
+                                                   "value": value,
+                                                   "error": 0}
+        return data
+
+    def bios(self):
+        return {"Version": FIRMWARE_VERSION,
+                "fru_type": "SYSTEM",
+                "is_fru": 1,
+                "present": "True",
+                "fault": "False"}
+
+class Handler(BaseHTTPRequestHandler):
+    # Keep-alive, so clients that pool connections can be told apart from
+    # clients that reconnect per request
+    protocol_version = "HTTP/1.1"
+    # Send each response in one segment instead of waiting on delayed ACKs
+    wbufsize = -1
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            BaseHTTPRequestHandler.log_message(self, format, *args)
+
+    def _reply(self, code, data, extra_headers=None):
+        body = json.dumps({"status": "ok" if code == 200 else "error",
+                           "message": "200 OK" if code == 200 else "error",
+                           "data": data}).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for (key, value) in (extra_headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if not length:
+            return None
+        try:
+            return json.loads(self.rfile.read(length).decode("utf-8"))
+        except ValueError:
+            return None
+
+    def _delay_and_fail(self):
+        state = self.server.state
+        with state.lock:
+            state.requests += 1
+            delay = state.latency + state.random.uniform(0, state.jitter)
+            fail = state.random.random() < state.failure_rate
+            if fail:
+                state.failures += 1
+        if delay > 0:
+            time.sleep(delay)
+        if fail:
+            self._reply(503, "injected failure")
+        return fail
+
+    def _logged_in(self):
+        cookie = self.headers.get("Cookie") or ""
+        if COOKIE not in cookie:
+            self._reply(401, "Login required")
+            return False
+        return True
+
+    def do_GET(self):
+        if self._delay_and_fail():
+            return
+        if not self._logged_in():
+            return
+
+        state = self.server.state
+        path = self.path.rstrip("/")
+
+        if path == "/org/openbmc":
+            self._reply(200, ["/org/openbmc/control",
+                              "/org/openbmc/inventory",
+                              "/org/openbmc/sensors"])
+        elif path == "/org/openbmc/control/enumerate":
+            self._reply(200, state.control())
+        elif path == "/org/openbmc/inventory/system/enumerate":
+            self._reply(200, state.inventory())
+        elif path == "/org/openbmc/inventory/system/bios":
+            self._reply(200, state.bios())
+        elif path == "/org/openbmc/sensors/enumerate":
+            self._reply(200, state.sensors())
+        elif path == "/org/openbmc/sensors/host/BootProgress":
+            self._reply(200, {"units": "",
+                              "value": state.boot_progress(),
+                              "error": 0})
+        else:
+            self._reply(404, "%s not found" % (self.path, ))
+
+    def do_POST(self):
+        # Read the body first, even for injected failures, or it would be
+        # parsed as the next request on this keep-alive connection
+        body = self._read_body()
+        if self._delay_and_fail():
+            return
+
+        state = self.server.state
+        path = self.path.rstrip("/")
+
+        if path == "/login":
+            if body is None or body.get("data") != [state.user,
+                                                    state.password]:
+                self._reply(401, "Invalid username or password")
+                return
+            self._reply(200,
+                        "User '%s' logged in" % (state.user, ),
+                        {"Set-Cookie": COOKIE + "; Path=/"})
+            return
+
+        if not self._logged_in():
+            return
+
+        if path == "/org/openbmc/control/chassis0/action/powerOn":
+            state.set_power_state(1)
+            self._reply(200, None)
+        elif path == "/org/openbmc/control/chassis0/action/powerOff":
+            state.set_power_state(0)
+            self._reply(200, None)
+        elif path == ("/org/openbmc/sensors/host/BootProgress"
+                      "/action/getValue"):
+            self._reply(200, state.boot_progress())
+        elif path == ("/org/openbmc/NetworkManager/Interface"
+                      "/action/GetAddress4"):
+            host = self.server.server_address[0]
+            self._reply(200, [[[2, 24, 0, host]], "0.0.0.0", ""])
+        else:
+            self._reply(404, "%s not found" % (self.path, ))
+
+class MockServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def handle_error(self, request, client_address):
+        # Clients dropping keep-alive connections end in an SSL EOF here,
+        # which is expected and only interesting when debugging
+        if self.verbose:
+            HTTPServer.handle_error(self, request, client_address)
+
+def make_certificate(directory):
+    # A throwaway self signed certificate, the same kind OpenBMC ships with
+    cert = os.path.join(directory, "cert.pem")
+    key = os.path.join(directory, "key.pem")
+    with open(os.devnull, "w") as devnull:
+        subprocess.check_call(["openssl", "req", "-x509", "-nodes",
+                               "-newkey", "rsa:2048", "-days", "1",
+                               "-subj", "/CN=localhost",
+                               "-keyout", key, "-out", cert],
+                              stdout=devnull, stderr=devnull)
+    return (cert, key)
+
+class MockOpenBmc(object):
+    # Run a mock BMC in a background thread:
+    #
+    #   with MockOpenBmc(latency=0.02) as bmc:
+    #       hostname = bmc.hostname      # "127.0.0.1:<port>"
+
+    def __init__(self, host="127.0.0.1", port=0, cert=None, key=None,
+                 verbose=False, **state_args):
+        self.tmpdir = None
+        if cert is None:
+            self.tmpdir = tempfile.mkdtemp(prefix="mockOpenBmc")
+            (cert, key) = make_certificate(self.tmpdir)
+
+        self.server = MockServer((host, port), Handler)
+        self.server.state = BmcState(**state_args)
+        self.server.verbose = verbose
+
+        protocol = getattr(ssl, "PROTOCOL_TLS_SERVER", ssl.PROTOCOL_SSLv23)
+        context = ssl.SSLContext(protocol)
+        context.load_cert_chain(cert, key)
+        self.server.socket = context.wrap_socket(self.server.socket,
+                                                 server_side=True)
+        self.thread = None
+
+    @property
+    def state(self):
+        return self.server.state
+
+    @property
+    def hostname(self):
+        return "%s:%d" % self.server.server_address[:2]
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        if self.tmpdir is not None:
+            shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+def add_state_arguments(parser):
+    # Shared with benchOpenBmc.py
+    parser.add_argument("--latency",
+                        action="store",
+                        type=float,
+                        default=0.0,
+                        help="milliseconds added to every response")
+    parser.add_argument("--jitter",
+                        action="store",
+                        type=float,
+                        default=0.0,
+                        help="up to this many random extra milliseconds")
+    parser.add_argument("--failure-rate",
+                        action="store",
+                        type=float,
+                        default=0.0,
+                        dest="failure_rate",
+                        help="fraction of requests answered with 503")
+    parser.add_argument("--dimms",
+                        action="store",
+                        type=int,
+                        default=16,
+                        help="number of DIMMs in the inventory")
+    parser.add_argument("--padding",
+                        action="store",
+                        type=int,
+                        default=0,
+                        help="extra bytes per DIMM inventory entry")
+    parser.add_argument("--power-delay",
+                        action="store",
+                        type=float,
+                        default=0.0,
+                        dest="power_delay",
+                        help="seconds before a power change is visible")
+    parser.add_argument("--seed",
+                        action="store",
+                        type=int,
+                        default=None,
+                        help="random seed for jitter and failures")
+
+def state_kwargs(args):
+    return {"dimms": args.dimms,
+            "padding": args.padding,
+            "latency": args.latency / 1000.0,
+            "jitter": args.jitter / 1000.0,
+            "failure_rate": args.failure_rate,
+            "power_delay": args.power_delay,
+            "seed": args.seed}
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Emulate an OpenBMC.")
+    parser.add_argument("--host",
+                        action="store",
+                        default="127.0.0.1",
+                        help="address to listen on")
+    parser.add_argument("--port",
+                        action="store",
+                        type=int,
+                        default=8443,
+                        help="port to listen on")
+    parser.add_argument("--cert",
+                        action="store",
+                        help="PEM certificate, generated if missing")
+    parser.add_argument("--key",
+                        action="store",
+                        help="PEM private key for --cert")
+    parser.add_argument("-v",
+                        "--verbose",
+                        action="store_true",
+                        dest="verbose",
+                        help="log every request")
+    add_state_arguments(parser)
+
+    args = parser.parse_args()
+
+    bmc = MockOpenBmc(host=args.host,
+                      port=args.port,
+                      cert=args.cert,
+                      key=args.key,
+                      verbose=args.verbose,
+                      **state_kwargs(args))
+
+    print("Mock OpenBMC listening on https://%s" % (bmc.hostname, ))
+    sys.stdout.flush()
+
+    try:
+        bmc.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        bmc.stop()
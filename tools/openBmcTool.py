@@ -31,7 +31,11 @@ import sys
 import pdb
 import requests
 from requests.packages.urllib3.exceptions import InsecureRequestWarning
+from requests.packages.urllib3.util.retry import Retry
 import json
+import shlex
+import StringIO
+import time
 
 # Create a decorator pattern that maintains a registry
 def makeRegistrar():
@@ -50,6 +54,39 @@ command = makeRegistrar()
 # Sadly a way to fit the line into 78 characters mainly
 JSON_HEADERS = {"Content-Type": "application/json"}
 
+class TimeoutSession(requests.Session):
+    # requests.Session has no default timeout, so every session.get and
+    # session.post below picks up self.timeout unless told otherwise.
+    # While a batch step runs, deadline bounds every request to the time
+    # the step has left.
+    timeout = None
+    deadline = None
+
+    def request(self, method, url, **kwargs):
+        timeout = kwargs.get("timeout", self.timeout)
+        if self.deadline is not None:
+            remaining = self.deadline - time.time()
+            if remaining <= 0:
+                raise requests.exceptions.Timeout("step deadline passed "
+                                                  "before %s %s"
+                                                  % (method, url, ))
+            if timeout is None or timeout > remaining:
+                timeout = remaining
+        kwargs["timeout"] = timeout
+        return super(TimeoutSession, self).request(method, url, **kwargs)
+
+def _new_session(args):
+    # One keep-alive connection to the BMC, with retries for connection
+    # errors on the idempotent GETs
+    session = TimeoutSession()
+    session.timeout = args.timeout
+    retry = Retry(total=3, backoff_factor=0.2)
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1,
+                                            pool_maxsize=1,
+                                            max_retries=retry)
+    session.mount("https://", adapter)
+    return session
+
 def _login(session, args):
     # Log in with a special URL and JSON data structure
     login_data = json.dumps({"data": [ args.user, args.password ]})
@@ -421,6 +458,175 @@ def get_boot_progress(session, parser, args, subparsers = None):
 
     return True
 
+class StepError(Exception):
+    pass
+
+class StepParser(argparse.ArgumentParser):
+    # A batch step must never exit the whole batch
+    def error(self, message):
+        raise StepError(message)
+
+def _step_sleep(session, parser, args, subparsers = None):
+    if subparsers is not None:
+        parser_sleep = subparsers.add_parser("sleep")
+        parser_sleep.add_argument("seconds",
+                                  action="store",
+                                  type=float,
+                                  help="seconds to wait")
+        parser_sleep.set_defaults(func=_step_sleep)
+        return
+
+    time.sleep (args.seconds)
+    return True
+
+def _new_step_parser():
+    step_parser = StepParser(prog="batch step")
+    step_parser.add_argument("--timeout",
+                             action="store",
+                             type=float,
+                             dest="step_timeout",
+                             help="seconds the step may take")
+    step_parser.add_argument("--until-ok",
+                             action="store_true",
+                             dest="until_ok",
+                             help="repeat the step until it succeeds")
+    step_parser.add_argument("--interval",
+                             action="store",
+                             type=float,
+                             default=2.0,
+                             dest="interval",
+                             help="seconds between --until-ok attempts")
+    step_parser.add_argument("--on-fail",
+                             action="store",
+                             choices=["stop", "continue"],
+                             default="stop",
+                             dest="on_fail",
+                             help="what to do when the step fails")
+
+    step_subparsers = step_parser.add_subparsers(help='step command')
+
+    for func in command.all.values():
+        if func is batch:
+            continue
+        func (None, step_parser, None, step_subparsers)
+    _step_sleep (None, step_parser, None, step_subparsers)
+
+    return step_parser
+
+def _run_step(session, step_parser, step_args):
+    # Run one step, capturing what the command prints
+    saved = (sys.stdout, sys.stderr, session.deadline)
+    output = StringIO.StringIO()
+    sys.stdout = sys.stderr = output
+
+    start = time.time()
+    attempts = 0
+    ok = False
+    error = None
+
+    if step_args.step_timeout is not None:
+        session.deadline = start + step_args.step_timeout
+
+    try:
+        while True:
+            attempts += 1
+            try:
+                ok = bool(step_args.func(session, step_parser, step_args))
+            except (StepError, requests.RequestException) as e:
+                ok = False
+                error = str(e)
+            except Exception as e:
+                # Such as a KeyError or ValueError from an unexpected answer,
+                # which must fail this step, not the whole batch
+                ok = False
+                error = "%s: %s" % (type(e).__name__, e)
+
+            if ok or not step_args.until_ok:
+                break
+            # Without --timeout, --until-ok keeps trying forever
+            elapsed = time.time() - start
+            if step_args.step_timeout is not None:
+                if elapsed + step_args.interval > step_args.step_timeout:
+                    error = "timed out after %d attempts" % (attempts, )
+                    break
+            time.sleep (step_args.interval)
+    finally:
+        (sys.stdout, sys.stderr, session.deadline) = saved
+
+    # Retries inside requests and steps without requests (sleep) can still
+    # run over, a late step never counts as ok
+    elapsed = time.time() - start
+    if step_args.step_timeout is not None and elapsed > step_args.step_timeout:
+        ok = False
+        error = "timed out"
+
+    return {"ok": ok,
+            "attempts": attempts,
+            "elapsed": round(elapsed, 3),
+            "error": error,
+            "output": output.getvalue()}
+
+@command
+def batch(session, parser, args, subparsers = None):
+    if subparsers is not None:
+        parser_batch = subparsers.add_parser("batch",
+                                             help=("run one command per line"
+                                                   " over a single session"))
+        parser_batch.add_argument("file",
+                                  nargs="?",
+                                  default="-",
+                                  help="file of steps, - for stdin")
+        parser_batch.set_defaults(func=batch)
+        return
+
+    # Every line is a sub-command, optionally preceded by step options:
+    #
+    #   set_power off
+    #   --until-ok --timeout 120 --interval 5 is_power off
+    #   --on-fail continue show_memory
+    #   set_power on
+    #   sleep 30
+    #   get_boot_progress
+    #
+    # One JSON object is written to stdout per step.  A failed step stops
+    # the batch unless it was given --on-fail continue.
+    if args.file == "-":
+        lines = sys.stdin.readlines()
+    else:
+        with open(args.file) as fp:
+            lines = fp.readlines()
+
+    step_parser = _new_step_parser()
+    all_ok = True
+
+    for (lineno, line) in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+
+        try:
+            step_args = step_parser.parse_args(shlex.split(line))
+        except StepError as e:
+            result = {"ok": False, "error": str(e), "attempts": 0}
+            step_args = None
+        else:
+            # The commands look for these on args
+            step_args.hostname = args.hostname
+            step_args.verbose = args.verbose
+            result = _run_step(session, step_parser, step_args)
+
+        result["step"] = lineno
+        result["command"] = line
+        print json.dumps(result, sort_keys=True)
+        sys.stdout.flush()
+
+        if not result["ok"]:
+            all_ok = False
+            if step_args is None or step_args.on_fail == "stop":
+                break
+
+    return all_ok
+
 if __name__ == "__main__":
 
     parser = argparse.ArgumentParser(description="Perform OpenBMC operations.")
@@ -447,6 +653,12 @@ if __name__ == "__main__":
                         action="store_true",
                         dest="verbose",
                         help="verbose")
+    parser.add_argument("-t",
+                        "--timeout",
+                        action="store",
+                        type=float,
+                        dest="timeout",
+                        help="seconds to wait for each BMC response")
 
     subparsers = parser.add_subparsers(help='sub-command help')
 
@@ -476,7 +688,7 @@ if __name__ == "__main__":
     requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
 
     # Create a http session
-    session = requests.Session()
+    session = _new_session(args)
 
     # Log into the host session
     if not _login(session, args):
@@ -0,0 +1,262 @@
+#!/usr/bin/python
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+#
+# Staggered bulk power sequencing for OpenBMC machines.
+#
+# Powering a whole rack on at once causes inrush current spikes and
+# overloads the BMC web servers.  This runs set_power against many hosts,
+# but never has more than --group-concurrency hosts of one rack or PDU
+# switching at the same time, starts them at least --stagger seconds
+# apart within a group, and holds each slot until is_power confirms the
+# transition.
+#
+# The host file has one host per line, optionally followed by its rack
+# and PDU:
+#
+#   # hostname        rack    pdu
+#   bmc-r1-01         r1      pdu-a
+#   bmc-r1-02         r1      pdu-b
+#
+# Example:
+#
+#   ./powerSequencer.py -u root -p 0penBmc --group-concurrency 2 \
+#       --stagger 5 hosts.txt on
+#
+# One JSON line is written per host as it finishes, then a summary line.
+#
+
+from __future__ import print_function
+
+import argparse
+import collections
+import json
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                ".."))
+
+from powerpc_hardware_manager import openbmc
+
+import hostFile
+
+Host = collections.namedtuple('Host', ['hostname', 'rack', 'pdu'])
+
+def group_key(host, group_by):
+    if group_by == "rack":
+        return host.rack or "default"
+    # A PDU is only unique within its rack
+    return "%s/%s" % (host.rack or "default", host.pdu or "default", )
+
+class Group(object):
+    def __init__(self, name):
+        self.name = name
+        self.pending = collections.deque()
+        self.active = 0
+        self.next_start = 0.0
+
+def power_host(host, args, on, queued):
+    # Switch one host and wait until the BMC reports the new state
+    result = {"host": host.hostname,
+              "rack": host.rack,
+              "pdu": host.pdu,
+              "queued_s": round(time.time() - queued, 3)}
+    start = time.time()
+
+    client = openbmc.OpenBMCClient(host.hostname,
+                                   args.user,
+                                   args.password,
+                                   timeout=(3.05, args.request_timeout))
+    try:
+        changed = client.set_power(on)
+        result["command_s"] = round(time.time() - start, 3)
+
+        if not changed:
+            result["result"] = "already"
+        else:
+            deadline = start + args.timeout
+            while client.is_power_on() != on:
+                if time.time() + args.poll_interval > deadline:
+                    result["result"] = "timeout"
+                    break
+                time.sleep(args.poll_interval)
+            else:
+                result["result"] = "ok"
+                result["confirm_s"] = round(time.time() - start, 3)
+    except openbmc.OpenBMCError as e:
+        result["result"] = "error"
+        result["error"] = str(e)
+    finally:
+        client.close()
+
+    result["total_s"] = round(time.time() - queued, 3)
+    return result
+
+def sequence(hosts, args, on, report):
+    """Power every host, honoring the per group and global limits.
+
+    A single dispatcher thread decides what to start next, so no worker
+    sits blocked on a full group while another group could make progress.
+    """
+    groups = collections.OrderedDict()
+    for host in hosts:
+        key = group_key(host, args.group_by)
+        groups.setdefault(key, Group(key)).pending.append(host)
+
+    condition = threading.Condition()
+    state = {"active": 0}
+    results = []
+    queued = time.time()
+
+    def worker(group, host):
+        result = {"host": host.hostname,
+                  "rack": host.rack,
+                  "pdu": host.pdu,
+                  "result": "error"}
+        try:
+            result = power_host(host, args, on, queued)
+        except Exception as e:
+            # Such as a malformed payload; the slot must still be freed or
+            # the dispatcher waits for this host forever
+            result["error"] = "%s: %s" % (type(e).__name__, e, )
+        finally:
+            result["group"] = group.name
+            with condition:
+                group.active -= 1
+                state["active"] -= 1
+                results.append(result)
+                report(result)
+                condition.notify()
+
+    with condition:
+        while any(group.pending for group in groups.values()):
+            now = time.time()
+            wake = None
+
+            for group in groups.values():
+                if not group.pending:
+                    continue
+                if state["active"] >= args.max_concurrency:
+                    break
+                if group.active >= args.group_concurrency:
+                    continue
+                if now < group.next_start:
+                    if wake is None or group.next_start < wake:
+                        wake = group.next_start
+                    continue
+
+                host = group.pending.popleft()
+                group.active += 1
+                group.next_start = now + args.stagger
+                state["active"] += 1
+                thread = threading.Thread(target=worker, args=(group, host))
+                thread.daemon = True
+                thread.start()
+
+            # Sleep until a host finishes or the next stagger slot opens
+            if wake is None:
+                condition.wait(1.0)
+            else:
+                condition.wait(max(wake - time.time(), 0.01))
+
+        while state["active"]:
+            condition.wait(1.0)
+
+    return results
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Staggered bulk power.")
+    parser.add_argument("-u",
+                        "--user",
+                        action="store",
+                        required=True,
+                        help="BMC user")
+    parser.add_argument("-p",
+                        "--password",
+                        action="store",
+                        required=True,
+                        help="BMC password")
+    parser.add_argument("--group-by",
+                        action="store",
+                        choices=["rack", "pdu"],
+                        default="pdu",
+                        dest="group_by",
+                        help="what the per group limits apply to")
+    parser.add_argument("--group-concurrency",
+                        action="store",
+                        type=int,
+                        default=1,
+                        dest="group_concurrency",
+                        help="hosts of one group switching at once")
+    parser.add_argument("--max-concurrency",
+                        action="store",
+                        type=int,
+                        default=32,
+                        dest="max_concurrency",
+                        help="hosts switching at once overall")
+    parser.add_argument("--stagger",
+                        action="store",
+                        type=float,
+                        default=2.0,
+                        help="minimum seconds between starts in a group")
+    parser.add_argument("--timeout",
+                        action="store",
+                        type=float,
+                        default=300.0,
+                        help="seconds to wait for is_power to confirm")
+    parser.add_argument("--poll-interval",
+                        action="store",
+                        type=float,
+                        default=2.0,
+                        dest="poll_interval",
+                        help="seconds between is_power checks")
+    parser.add_argument("--request-timeout",
+                        action="store",
+                        type=float,
+                        default=30.0,
+                        dest="request_timeout",
+                        help="seconds to wait for each BMC response")
+    parser.add_argument("hosts",
+                        action="store",
+                        help="host file, - for stdin")
+    parser.add_argument("command",
+                        action="store",
+                        choices=["on", "off"],
+                        help="{on,off}")
+
+    args = parser.parse_args()
+
+    hosts = [Host(*fields) for fields in hostFile.read_hosts(args.hosts, 3)]
+
+    def report(result):
+        print(json.dumps(result, sort_keys=True))
+        sys.stdout.flush()
+
+    start = time.time()
+    results = sequence(hosts, args, args.command == "on", report)
+
+    counts = collections.Counter(result["result"] for result in results)
+    summary = {"summary": True,
+               "hosts": len(results),
+               "seconds": round(time.time() - start, 3)}
+    summary.update(counts)
+    report(summary)
+
+    if counts.get("error") or counts.get("timeout"):
+        sys.exit(2)
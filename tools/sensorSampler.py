@@ -0,0 +1,169 @@
+#!/usr/bin/python
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+#
+# Temperature, fan and power telemetry from many OpenBMC machines, for
+# watching burn-in runs and firmware rollouts.
+#
+# Every host is polled from its own thread through one logged in session,
+# with a single enumerate of /org/openbmc/sensors every --interval
+# seconds.  First polls are spread over the interval so the BMCs are not
+# hit at the same moment, and a poll that falls behind skips the missed
+# ticks instead of catching up in a burst.  Readings go into fixed size
+# ring buffers (see powerpc_hardware_manager.sensors), so memory does not
+# grow with the duration.
+#
+# The host file has one BMC per line:
+#
+#   # hostname
+#   bmc-r1-01
+#   bmc-r1-02
+#
+# Example:
+#
+#   ./sensorSampler.py -u root -p 0penBmc --interval 5 --duration 3600 \
+#       --csv samples.csv hosts.txt > summary.csv
+#
+# A summary row per host and sensor is written to stdout when sampling
+# ends, after --duration seconds or on Ctrl-C.
+#
+
+from __future__ import print_function
+
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                ".."))
+
+from powerpc_hardware_manager import openbmc
+from powerpc_hardware_manager import sensors
+
+import hostFile
+
+def sample_host(hostname, args, log, stop, errors):
+    client = openbmc.OpenBMCClient(hostname,
+                                   args.user,
+                                   args.password,
+                                   timeout=(3.05, args.request_timeout),
+                                   pool_maxsize=1)
+    next_poll = time.time() + random.uniform(0, args.interval)
+    try:
+        while not stop.wait(max(next_poll - time.time(), 0)):
+            try:
+                readings = client.get_sensors()
+            except openbmc.OpenBMCError as e:
+                with log.lock:
+                    errors[hostname] = errors.get(hostname, 0) + 1
+                print("%s: %s" % (hostname, e), file=sys.stderr)
+            else:
+                log.record(hostname, time.time(), readings)
+
+            next_poll += args.interval
+            now = time.time()
+            if next_poll < now:
+                # Skip the ticks a slow BMC made us miss
+                missed = int((now - next_poll) / args.interval) + 1
+                next_poll += missed * args.interval
+    finally:
+        client.close()
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Sample BMC sensors.")
+    parser.add_argument("-u",
+                        "--user",
+                        action="store",
+                        required=True,
+                        help="BMC user")
+    parser.add_argument("-p",
+                        "--password",
+                        action="store",
+                        required=True,
+                        help="BMC password")
+    parser.add_argument("--interval",
+                        action="store",
+                        type=float,
+                        default=10.0,
+                        help="seconds between polls of one host")
+    parser.add_argument("--duration",
+                        action="store",
+                        type=float,
+                        default=0.0,
+                        help="seconds to sample, 0 until interrupted")
+    parser.add_argument("--capacity",
+                        action="store",
+                        type=int,
+                        default=360,
+                        help="samples kept per sensor")
+    parser.add_argument("--request-timeout",
+                        action="store",
+                        type=float,
+                        default=10.0,
+                        dest="request_timeout",
+                        help="seconds to wait for each BMC response")
+    parser.add_argument("--csv",
+                        action="store",
+                        dest="csv",
+                        help="write every kept sample to this file")
+    parser.add_argument("hosts",
+                        action="store",
+                        help="host file, - for stdin")
+
+    args = parser.parse_args()
+
+    if args.interval <= 0:
+        parser.error("--interval must be positive")
+
+    hosts = [hostname for (hostname, ) in hostFile.read_hosts(args.hosts)]
+
+    log = sensors.SensorLog(args.capacity)
+    stop = threading.Event()
+    errors = {}
+
+    threads = []
+    for hostname in hosts:
+        thread = threading.Thread(target=sample_host,
+                                  args=(hostname, args, log, stop, errors))
+        thread.daemon = True
+        thread.start()
+        threads.append(thread)
+
+    start = time.time()
+    try:
+        # Short sleeps, python 2 cannot interrupt a blocking wait
+        while not args.duration or time.time() - start < args.duration:
+            time.sleep(min(1.0, args.duration or 1.0))
+    except KeyboardInterrupt:
+        pass
+
+    stop.set()
+    for thread in threads:
+        thread.join(args.request_timeout * 2)
+
+    if args.csv:
+        with open(args.csv, "w") as fp:
+            log.write_csv(fp)
+
+    log.write_summary_csv(sys.stdout)
+
+    print("%d hosts, %d sensors, %d bytes of samples, %d failed polls in "
+          "%.1fs" % (len(hosts), len(log.buffers), log.nbytes(),
+                     sum(errors.values()), time.time() - start),
+          file=sys.stderr)